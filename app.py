@@ -1,72 +1,183 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Flask, Blueprint, current_app, render_template, request, redirect, url_for, flash, jsonify, session, send_from_directory, abort, g, stream_with_context
+from werkzeug.local import LocalProxy
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from datetime import datetime, timedelta
 from werkzeug.utils import secure_filename
 from werkzeug.security import generate_password_hash, check_password_hash
-from flask_dance.contrib.google import make_google_blueprint, google
-from difflib import SequenceMatcher
+from sqlalchemy import func, tuple_, update
+from sqlalchemy.orm import aliased, selectinload
 import os
-import requests
+import json
+import click
+import uuid
+import threading
+from functools import wraps
 from dotenv import load_dotenv
-from flask_mail import Mail, Message
 from itsdangerous import URLSafeTimedSerializer, SignatureExpired, BadSignature
 import sqlite3
-from locations import get_faculty_name
-
-load_dotenv()
-
-os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1' # http for local dev
+from locations import get_faculty_name_cached, map_locations
+from search_index import search_card_ids
+from spatial_index import markers_in_bbox
+from media import MediaProcessor, process_photo, extract_poster, variant_paths
+import storage
+import uploads
+import transfer
+import card_stats
+from mail_queue import MailQueue
+from cache import PageCache
+from db_config import init_db_config, init_query_counter, read_session
+from metrics import Metrics
+from ratelimit import RateLimiter
 
 # ---------- Config ----------
 UPLOAD_FOLDER = "static/uploads"
 ALLOWED_IMAGE_EXT = {"png", "jpg", "jpeg", "gif", "webp"}
 ALLOWED_VIDEO_EXT = {"mp4", "webm", "ogg", "mov"}
+CARDS_PER_PAGE = 12
+ADMIN_PAGE_SIZE = 20
+USERS_PER_PAGE = 50
+CARD_STATUSES = ("pending", "approved", "rejected", "archived")
+MODERATION_ACTIONS = {"approve": "approved", "reject": "rejected", "archive": "archived"}
+MAX_BULK_IDS = 1000
+
+
+def load_config(app):
+    """Settings from the environment (and .env), before any create_app overrides"""
+    app.secret_key = "super_secret_091725"
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv("DATABASE_URL", 'sqlite:///app.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {"connect_args": {"timeout": 5}}
+    # separate read-only connection pool for the public pages (see db_config.py)
+    app.config['SQLALCHEMY_READ_ONLY_ENGINE'] = os.getenv("SQLALCHEMY_READ_ONLY_ENGINE", "1") == "1"
+    app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
+    # whole-request cap; large videos go through the chunked /uploads endpoints instead
+    app.config["MAX_CONTENT_LENGTH"] = 64 * 1024 * 1024
+    app.config["VIDEO_MAX_SIZE"] = 2 * 1024 * 1024 * 1024
+    app.config["PARTIAL_UPLOAD_FOLDER"] = os.path.join(app.instance_path, "partial_uploads")
+    # set to e.g. "/protected-media/" to hand media transfers to an nginx internal location;
+    # for Apache/lighttpd X-Sendfile set USE_X_SENDFILE = True instead
+    app.config["MEDIA_ACCEL_REDIRECT"] = os.getenv("MEDIA_ACCEL_REDIRECT")
+    # requests running more SQL than this are logged (and fail under app.testing), see db_config.py
+    app.config["MAX_QUERIES_PER_REQUEST"] = int(os.getenv("MAX_QUERIES_PER_REQUEST", 30))
+    # per-route SQL/template/HTTP timing at /metrics, and sampled profiles of slow requests (see metrics.py)
+    app.config["METRICS_ENABLED"] = os.getenv("METRICS_ENABLED", "0") == "1"
+    app.config["METRICS_TOKEN"] = os.getenv("METRICS_TOKEN")
+    app.config["PROFILE_SAMPLE_RATE"] = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+    # token buckets, (per second, burst), per logged-in user or per IP (see ratelimit.py)
+    app.config["RATE_LIMIT_ENABLED"] = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+    app.config["RATE_LIMITS"] = {"location": (5, 30), "search": (1, 10)}
+    app.config["RATE_LIMIT_REDIS_URL"] = os.getenv("RATE_LIMIT_REDIS_URL")
+
+    # Email Config
+    app.config['MAIL_SERVER'] = os.getenv("MAIL_SERVER", 'smtp.gmail.com')
+    app.config['MAIL_PORT'] = int(os.getenv("MAIL_PORT", 587))
+    app.config['MAIL_USE_TLS'] = os.getenv("MAIL_USE_TLS", "1") == "1"
+    app.config['MAIL_USERNAME'] = os.getenv("MAIL_USERNAME")
+    app.config['MAIL_PASSWORD'] = os.getenv("MAIL_PASSWORD")
+
+    # GOOGLE API, Google login is only offered when a client id is set
+    app.config["GOOGLE_CLIENT_ID"] = os.getenv("GOOGLE_CLIENT_ID")
+    app.config["GOOGLE_CLIENT_SECRET"] = os.getenv("GOOGLE_CLIENT_SECRET")
+    # seconds; a stalled Google call would otherwise hold a worker thread indefinitely
+    app.config["GOOGLE_API_TIMEOUT"] = float(os.getenv("GOOGLE_API_TIMEOUT", 5))
+
+    # Spotify
+    app.config["SPOTIFY_CLIENT_ID"] = os.getenv("SPOTIFY_CLIENT_ID")
+    app.config["SPOTIFY_CLIENT_SECRET"] = os.getenv("SPOTIFY_CLIENT_SECRET")
+    app.config["SPOTIFY_ACCOUNTS_URL"] = os.getenv("SPOTIFY_ACCOUNTS_URL")
+    app.config["SPOTIFY_API_URL"] = os.getenv("SPOTIFY_API_URL")
+
+
+# Extensions are created unbound and attached to the app in create_app()
+db = SQLAlchemy()
+metrics = Metrics()
+media = MediaProcessor()
+page_cache = PageCache()
+rate_limiter = RateLimiter()
+mail_queue = MailQueue()
+
+# every route, hook and CLI command of the site; cli_group=None keeps `flask drain-mail` etc. top level
+main = Blueprint("main", __name__, cli_group=None)
+
+
+def include_in_autogenerate(obj, name, type_, reflected, compare_to):
+    # the FTS5 and R*Tree virtual tables (and their shadow tables) and the trigger-kept
+    # counters are written into migrations by hand
+    return not (type_ == "table" and name.startswith(("card_fts", "card_rtree", "card_stats")))
+
+
+def init_migrations(app):
+    """Flask-Migrate, for `flask db ...` and scripts that upgrade the schema themselves"""
+    from flask_migrate import Migrate
+    Migrate(app, db, render_as_batch=True, include_object=include_in_autogenerate)
+
+
+def init_google_login(app):
+    # flask-dance (and oauthlib) are only imported when Google login is configured
+    from flask_dance.contrib.google import make_google_blueprint
+
+    os.environ.setdefault('OAUTHLIB_INSECURE_TRANSPORT', '1')  # http for local dev
+    google_bp = make_google_blueprint(
+        client_id=app.config["GOOGLE_CLIENT_ID"],
+        client_secret=app.config["GOOGLE_CLIENT_SECRET"],
+        scope=[
+            "openid",
+            "https://www.googleapis.com/auth/userinfo.profile",
+            "https://www.googleapis.com/auth/userinfo.email"
+        ],
+        redirect_url="/google_authorized"
+    )
+    app.register_blueprint(google_bp, url_prefix="/login")
 
-app = Flask(__name__)
-app.secret_key = "super_secret_091725"
-
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///app.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 
+def create_app(config=None):
+    """Build the app. config (a dict) overrides the environment settings.
 
-db = SQLAlchemy(app)
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    Only what every request needs is set up here: the Spotify client and
+    Flask-Mail are loaded on first use, Google login (flask-dance) only when
+    GOOGLE_CLIENT_ID is set, and the schema is left to `flask db upgrade`.
+    """
+    load_dotenv()
+    app = Flask(__name__)
+    load_config(app)
+    app.config.from_mapping(config or {})
 
-# Email Config
-app.config['MAIL_SERVER'] = 'smtp.gmail.com'
-app.config['MAIL_PORT'] = 587
-app.config['MAIL_USE_TLS'] = True
-app.config['MAIL_USERNAME'] = os.getenv("MAIL_USERNAME")
-app.config['MAIL_PASSWORD'] = os.getenv("MAIL_PASSWORD")
-mail = Mail(app)
+    db.init_app(app)
+    init_db_config(app, db)
+    init_query_counter(app)
+    metrics.init_app(app)
 
-# Token Serializer
-s = URLSafeTimedSerializer(app.secret_key)
+    # schema changes live in migrations/, apply them with `flask db upgrade`. Flask-Migrate
+    # imports all of alembic, so only the flask command line gets it (workers never migrate)
+    if click.get_current_context(silent=True) is not None:
+        init_migrations(app)
 
-# GOOGLE API
-GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
-GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
+    os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
+    os.makedirs(app.config["PARTIAL_UPLOAD_FOLDER"], exist_ok=True)
+    media.init_app(app)
+    page_cache.init_app(app)
+    rate_limiter.init_app(app)
+    mail_queue.init_app(app, db, OutboxMessage)
 
-google_bp = make_google_blueprint(
-    client_id=GOOGLE_CLIENT_ID,
-    client_secret=GOOGLE_CLIENT_SECRET,
-        scope=[
-        "openid",
-        "https://www.googleapis.com/auth/userinfo.profile",
-        "https://www.googleapis.com/auth/userinfo.email"
-    ],
-    redirect_url="/google_authorized"
-)
+    app.register_blueprint(main)
+    if app.config["GOOGLE_CLIENT_ID"]:
+        init_google_login(app)
+    return app
 
-app.register_blueprint(google_bp, url_prefix="/login")
 
-@app.route("/google_authorized")
+@main.route("/google_authorized")
 def google_authorized():
+    import requests
+    from flask_dance.contrib.google import google
+
     if not google.authorized:
         return redirect(url_for("google.login"))
 
-    resp = google.get("/oauth2/v2/userinfo")
+    try:
+        resp = google.get("/oauth2/v2/userinfo", timeout=current_app.config["GOOGLE_API_TIMEOUT"])
+    except requests.RequestException:
+        return "Google login failed", 502
     if not resp.ok:
         return "Google login failed", 400
 
@@ -81,18 +192,33 @@ def google_authorized():
         db.session.commit()
 
     # Save login session
-    session["user_id"] = user.id
-    session["username"] = user.username
+    remember_user(user)
     flash("✅ Logged in with Google!", "success")
-    return redirect(url_for("profile"))
-
-with app.app_context():
-    db.create_all()
-
-# Load .env for Spotify
-load_dotenv()
-CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
-CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
+    return redirect(url_for("main.profile"))
+
+_spotify_lock = threading.Lock()
+
+def get_spotify():
+    """The app's SpotifyClient, built on the first search"""
+    client = current_app.extensions.get("spotify")
+    if client is None:
+        with _spotify_lock:
+            client = current_app.extensions.get("spotify")
+            if client is None:
+                from spotify import SpotifyClient, ACCOUNTS_URL, API_URL
+                config = current_app.config
+                client = SpotifyClient(
+                    config["SPOTIFY_CLIENT_ID"],
+                    config["SPOTIFY_CLIENT_SECRET"],
+                    accounts_url=config["SPOTIFY_ACCOUNTS_URL"] or ACCOUNTS_URL,
+                    api_url=config["SPOTIFY_API_URL"] or API_URL,
+                )
+                metrics.instrument_session(client.session, "spotify")
+                current_app.extensions["spotify"] = client
+    return client
+
+def token_serializer():
+    return URLSafeTimedSerializer(current_app.secret_key)
 
 # ---------------- Helpers ---------------- #
 def allowed_file(filename, kind="image"):
@@ -103,39 +229,136 @@ def allowed_file(filename, kind="image"):
         return ext in ALLOWED_VIDEO_EXT
     return False
 
-def get_token():
-    """Request access token from Spotify"""
-    auth_url = "https://accounts.spotify.com/api/token"
-    auth_response = requests.post(
-        auth_url,
-        {
-            "grant_type": "client_credentials",
-            "client_id": CLIENT_ID,
-            "client_secret": CLIENT_SECRET,
-        },
-    )
-    auth_response_data = auth_response.json()
-    return auth_response_data["access_token"]
+def read_db():
+    return read_session(current_app, db)
+
+def get_current_user():
+    """The logged-in User, loaded at most once per request"""
+    if "current_user" not in g:
+        user_id = session.get("user_id")
+        g.current_user = db.session.get(User, user_id) if user_id else None
+    return g.current_user
+
+def remember_user(user):
+    """Log user in. Username and admin flag ride along in the signed session cookie
+    so most pages never need to load the User row."""
+    session["user_id"] = user.id
+    session["username"] = user.username
+    session["is_admin"] = bool(user.is_admin)
+    g.current_user = user
+
+def current_user_is_admin():
+    """Admins are users with is_admin set, or anyone who gave the admin passcode at login"""
+    if session.get("is_admin_temp"):
+        return True
+    if "is_admin" in session:
+        return session["is_admin"]
+    user = get_current_user()
+    return bool(user and user.is_admin)
+
+def admin_required(view):
+    """For admin pages and form posts: anonymous visitors are sent to the login page, other users get 403"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if "user_id" not in session:
+            flash("⚠️ Please log in first.", "warning")
+            return redirect(url_for("main.login"))
+        if not current_user_is_admin():
+            abort(403)
+        return view(*args, **kwargs)
+    return wrapper
+
+def encode_cursor(card):
+    return f"{card.created.isoformat()}_{card.id}"
+
+def decode_cursor(cursor):
+    try:
+        created, card_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(created), int(card_id)
+    except (AttributeError, ValueError):
+        return None
+
+def paginate_cards(query, cursor=None, per_page=CARDS_PER_PAGE):
+    """Keyset pagination over cards, newest first. Returns (cards, next_cursor)"""
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        query = query.filter(tuple_(Card.created, Card.id) < position)
+    cards = query.order_by(Card.created.desc(), Card.id.desc()).limit(per_page + 1).all()
+    next_cursor = encode_cursor(cards[per_page - 1]) if len(cards) > per_page else None
+    return cards[:per_page], next_cursor
 
 # ---------------- Models ---------------- #
 class Card(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     to_name = db.Column(db.String(50), nullable=False)
+    from_name = db.Column(db.String(50), nullable=True)
     location = db.Column(db.String(100), nullable=False)
     message = db.Column(db.Text, nullable=False)
-    photos = db.relationship("Photo", backref="card", lazy=True)
+    photos = db.relationship("Photo", backref="card", lazy=True, passive_deletes=True)
     video = db.Column(db.String(200), nullable=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True) 
+    video_poster = db.Column(db.String(200), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True, index=True)
     song = db.Column(db.Text, nullable=True)
-    created = db.Column(db.DateTime, default=datetime.utcnow)
+    created = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     lat = db.Column(db.Float, nullable=True)
     lng = db.Column(db.Float, nullable=True)
     status = db.Column(db.String(20), default="pending")  # pending, approved, rejected, archived
 
+    __table_args__ = (
+        db.Index("ix_card_status_created", "status", "created"),
+    )
+
 class Photo(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    card_id = db.Column(db.Integer, db.ForeignKey("card.id"), nullable=False)
+    card_id = db.Column(db.Integer, db.ForeignKey("card.id", ondelete="CASCADE"), nullable=False, index=True)
     file_path = db.Column(db.String(200), nullable=False)
+    variants = db.Column(db.Text, nullable=True)  # JSON written by media.process_photo
+
+    @property
+    def variant_data(self):
+        return json.loads(self.variants or "{}")
+
+
+class Blob(db.Model):
+    """Reference count for a content-addressed file under static/uploads (see storage.py)"""
+    path = db.Column(db.String(200), primary_key=True)
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+    # set while a media job processes the blob, see storage.claim()
+    processing = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+
+
+class VideoUpload(db.Model):
+    """An in-progress resumable video upload for a card (see uploads.py)"""
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    card_id = db.Column(db.Integer, db.ForeignKey("card.id", ondelete="CASCADE"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
+    filename = db.Column(db.String(200), nullable=False)
+    length = db.Column(db.BigInteger, nullable=False)
+    offset = db.Column(db.BigInteger, nullable=False, default=0)
+    created = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @property
+    def partial_path(self):
+        return os.path.join(current_app.config["PARTIAL_UPLOAD_FOLDER"], self.id)
+
+
+class OutboxMessage(db.Model):
+    """Outgoing email waiting for the background sender (see mail_queue.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(200), nullable=False)
+    sender = db.Column(db.String(150), nullable=True)
+    recipients = db.Column(db.Text, nullable=False)  # JSON list
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default="pending")  # pending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text, nullable=True)
+    created = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index("ix_outbox_message_status_next_attempt", "status", "next_attempt_at"),
+    )
 
 
 class User(db.Model):
@@ -145,10 +368,108 @@ class User(db.Model):
     password = db.Column(db.String(200), nullable=True)  # nullable so Google login works
     is_admin = db.Column(db.Boolean, default=False)  
 
+@main.cli.command("drain-mail")
+def drain_mail():
+    """Send every due message in the outbox now"""
+    total = 0
+    while sent := mail_queue.drain_once():
+        total += sent
+    print(f"Sent {total} messages")
+
+@main.cli.command("export-cards")
+@click.argument("output", default="-")
+@click.option("--format", "fmt", type=click.Choice(list(transfer.FORMATS)), default="ndjson")
+@click.option("--status", type=click.Choice(CARD_STATUSES), help="only cards with this status")
+def export_cards_command(output, fmt, status):
+    """Stream every card with its photo paths to OUTPUT (default stdout) as NDJSON or CSV"""
+    out = click.get_text_stream("stdout") if output == "-" else open(output, "w", encoding="utf-8", newline="")
+    with out, db.engine.connect() as conn:
+        for chunk in transfer.serialize(transfer.export_rows(conn, status), fmt):
+            out.write(chunk)
+
+@main.cli.command("import-cards")
+@click.argument("source", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(list(transfer.FORMATS)),
+              help="defaults to csv for .csv files, ndjson otherwise")
+@click.option("--batch-size", default=1000, show_default=True)
+def import_cards_command(source, fmt, batch_size):
+    """Bulk insert cards from an export file, in one transaction"""
+    fmt = fmt or ("csv" if source.lower().endswith(".csv") else "ndjson")
+    with open(source, encoding="utf-8", newline="") as f, db.engine.begin() as conn:
+        stats = transfer.import_cards(conn, transfer.read_records(f, fmt), batch_size)
+    page_cache.invalidate("feed")
+    print(f"Imported {stats['cards']} cards and {stats['photos']} photos in {stats['seconds']:.2f}s "
+          f"({stats['rows_per_second']:.0f} rows/s), skipped {stats['skipped']}")
+    for error in stats["errors"]:
+        print(f"  {error}")
+
+@main.cli.command("rebuild-card-stats")
+def rebuild_card_stats_command():
+    """Recount the per-location and per-user card counters from the card table"""
+    with db.engine.begin() as conn:
+        drift = card_stats.rebuild_card_stats(conn)
+    print(f"Rebuilt card counters, {drift} were out of date")
+
+# ---------------- Media jobs ---------------- #
+def process_photo_job(photo_id):
+    photo = db.session.get(Photo, photo_id)
+    if photo is None or photo.variants:
+        return
+    source = photo.file_path
+    # identical uploads share one blob, so reuse variants already made for it
+    done = Photo.query.filter(Photo.file_path == source, Photo.variants.isnot(None)).first()
+    if done:
+        photo.variants = done.variants
+        db.session.commit()
+        page_cache.invalidate(f"card:{photo.card_id}")
+        return
+
+    # only one job processes a blob, and it updates every photo sharing it
+    claimed = storage.claim(db.session, source)
+    db.session.commit()
+    if not claimed:
+        return
+    try:
+        result = process_photo(current_app.static_folder, source)
+    except Exception:
+        storage.unclaim(db.session, source)
+        db.session.commit()
+        raise
+    if result is None:
+        storage.unclaim(db.session, source)
+        db.session.commit()
+        return
+
+    file_path, variants = result
+    photos = Photo.query.filter_by(file_path=source).all()
+    unused = []
+    if file_path != source:
+        # the photo without its metadata is a blob of its own; move every reference to it
+        storage.acquire(db.session, file_path, len(photos))
+        if storage.release(db.session, source, len(photos)):
+            unused.append(source)
+    for shared in photos:
+        shared.file_path = file_path
+        shared.variants = json.dumps(variants)
+    storage.unclaim(db.session, source)
+    db.session.commit()
+    page_cache.invalidate("feed", *{f"card:{shared.card_id}" for shared in photos})
+    storage.remove_files(db.session, current_app.static_folder, unused)
+
+def process_video_job(card_id):
+    card = db.session.get(Card, card_id)
+    if card is None or not card.video:
+        return
+    poster = extract_poster(current_app.static_folder, card.video)
+    if poster:
+        card.video_poster = poster
+        db.session.commit()
+        page_cache.invalidate(f"card:{card_id}")
+
 # ---------------- Routes ---------------- #
 
 # ---------- Message Route ----------
-@app.route("/message", methods=["GET", "POST"])
+@main.route("/message", methods=["GET", "POST"])
 def message():
     if request.method == "POST":
         place_name = request.form.get("place_name")
@@ -163,49 +484,75 @@ def message():
 
 
 # ---------- Index Route ----------
-@app.route("/", methods=["GET"])
-
+@main.route("/", methods=["GET"])
+@page_cache.cached("feed")
 def index():
     search_query = request.args.get("q", "").strip()
 
-    cards = Card.query.filter_by(status="approved").all()
-
-    user = None
-    is_admin = False
-    if "user_id" in session:
-        user = User.query.get(session["user_id"])
-        is_admin = user.is_admin if user else False
-    
     if search_query:
-        filtered_cards = [
-            card for card in cards
-            if search_query.lower() in card.to_name.lower() or
-            (card.from_name and search_query.lower() in card.from_name.lower())
-        ]
-        def similarity(card):
-            to_similarity = SequenceMatcher(None, search_query.lower(), card.to_name.lower()).ratio()
-            from_similarity = SequenceMatcher(None, search_query.lower(), (card.from_name or "").lower()).ratio()
-            return max(to_similarity, from_similarity)
-        cards = sorted(filtered_cards, key=similarity, reverse=True)
+        page = request.args.get("page", 1, type=int)
+        offset = (max(page, 1) - 1) * CARDS_PER_PAGE
+        ids = search_card_ids(read_db(), search_query, limit=CARDS_PER_PAGE + 1, offset=offset)
+        found = {c.id: c for c in read_db().query(Card).filter(Card.id.in_(ids[:CARDS_PER_PAGE]))}
+        cards = [found[i] for i in ids[:CARDS_PER_PAGE] if i in found]
+        next_url = url_for("main.index", q=search_query, page=page + 1) if len(ids) > CARDS_PER_PAGE else None
     else:
-        cards = sorted(cards, key=lambda c: c.created, reverse=True)
-
-    map_cards = [
-        {"id": c.id, "to_name": c.to_name, "location": c.location,
-        "message": c.message, "lat": float(c.lat), "lng": float(c.lng)}
-        for c in cards if c.lat is not None and c.lng is not None
-    ]
-
-    return render_template("index.html", cards=cards, search_query=search_query, map_cards=map_cards)
+        query = read_db().query(Card).filter_by(status="approved")
+        cards, next_cursor = paginate_cards(query, request.args.get("before"))
+        next_url = url_for("main.index", before=next_cursor) if next_cursor else None
+
+    # the feed shows no photos, so it doesn't load them either
+    cards = [serialize_card(c, photos=False) for c in cards]
+    return render_template("index.html", cards=cards, search_query=search_query, next_url=next_url)
+
+@main.route("/api/markers")
+@page_cache.cached("feed")
+def map_markers():
+    """Approved card markers inside the map viewport, clustered when zoomed out"""
+    try:
+        south, west, north, east = (float(x) for x in request.args.get("bbox", "").split(","))
+        zoom = int(request.args.get("zoom", 15))
+    except ValueError:
+        return jsonify({"error": "bbox must be south,west,north,east and zoom an integer"}), 400
+
+    return jsonify(markers_in_bbox(read_db(), south, west, north, east, zoom))
+
+@main.route("/api/stats")
+def stats():
+    """Card counts from the trigger-kept counters: approved cards per map location for
+    everyone, your own cards by status when logged in, every status for admins"""
+    conn = read_db().connection()
+    by_location = card_stats.location_counts(conn)
+    locations = {name: 0 for name in map_locations}
+    for name, counts in by_location.items():
+        if counts.get("approved"):
+            locations[name] = counts["approved"]
+    result = {"locations": locations, "approved": sum(locations.values())}
 
-@app.route("/location", methods=["POST"])
+    if "user_id" in session:
+        result["mine"] = card_stats.user_counts(conn, [session["user_id"]]).get(session["user_id"], {})
+    if current_user_is_admin():
+        statuses = dict.fromkeys(CARD_STATUSES, 0)
+        for counts in by_location.values():
+            for status, count in counts.items():
+                statuses[status] = statuses.get(status, 0) + count
+        result["statuses"] = statuses
+        result["locations_by_status"] = by_location
+    return jsonify(result)
+
+@main.route("/location", methods=["POST"])
+@rate_limiter.limit("location")
 def location_lookup():
-    lat = float(request.form.get("lat"))
-    lng = float(request.form.get("lng"))
-    faculty_code = get_faculty_name(lat, lng)
-    return jsonify({"faculty_code": faculty_code})
-
-@app.route("/register", methods=["POST", "GET"])
+    try:
+        lat = float(request.form["lat"])
+        lng = float(request.form["lng"])
+    except (KeyError, ValueError):
+        return jsonify({"error": "lat and lng must be numbers"}), 400
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return jsonify({"error": "lat and lng out of range"}), 400
+    return jsonify({"faculty_code": get_faculty_name_cached(lat, lng)})
+
+@main.route("/register", methods=["POST", "GET"])
 def register():
     if request.method == "POST":
 
@@ -215,7 +562,7 @@ def register():
 
         if User.query.filter_by(username=username).first():
             flash("⚠️ Username already exists!", "danger")
-            return redirect(url_for("register"))
+            return redirect(url_for("main.register"))
 
         hashed_pw = generate_password_hash(password)
         new_user = User(username=username, email=email, password=hashed_pw)
@@ -223,11 +570,11 @@ def register():
         db.session.commit()
 
         flash("✅ Registration successful! Please log in.", "success")
-        return redirect(url_for("login"))
+        return redirect(url_for("main.login"))
     
     return render_template("login.html")
 
-@app.route("/login", methods=["POST", "GET"])
+@main.route("/login", methods=["POST", "GET"])
 def login():
     if request.method == "POST":
         username = request.form.get("username")
@@ -240,11 +587,6 @@ def login():
 
         if user and user.password and check_password_hash(user.password, password):
 
-            # admin access
-            if user and user.password and check_password_hash(user.password, password):
-                session["user_id"] = user.id
-                session["username"] = user.username
-
             if admin_check == "yes" and passcode == "1234":
                 session["is_admin_temp"] = True
                 flash("✅ Admin access granted for this session!", "success")
@@ -252,45 +594,43 @@ def login():
                 session["is_admin_temp"] = False
 
             # login session
-            session["user_id"] = user.id
-            session["username"] = user.username
+            remember_user(user)
             flash("✅ Login successful!", "success")
-            return redirect(url_for("profile"))
+            return redirect(url_for("main.profile"))
         else:
             flash("❌ Invalid username or password", "danger")
-            return redirect(url_for("login"))
+            return redirect(url_for("main.login"))
         
     return render_template("login.html")
 
-@app.route("/forgot", methods=["POST"])
+@main.route("/forgot", methods=["POST"])
 def forgot():
     email = request.form.get("email")
     user = User.query.filter_by(email=email).first()
 
     if not user:
         flash("❌ No account with that email.", "danger")
-        return redirect(url_for("login"))
+        return redirect(url_for("main.login"))
 
-    token = s.dumps(email, salt="reset-token")
-    reset_url = url_for("reset_token", token=token, _external=True)
+    token = token_serializer().dumps(email, salt="reset-token")
+    reset_url = url_for("main.reset_token", token=token, _external=True)
 
-    # Send email
-    msg = Message("Password Reset Request",
-                  sender=app.config['MAIL_USERNAME'],
-                  recipients=[email])
-    msg.body = f"Click the link to reset your password: {reset_url}\nThis link expires in 1 hour."
-    mail.send(msg)
+    # Queue the email, the background sender delivers it
+    mail_queue.enqueue("Password Reset Request",
+                       recipients=[email],
+                       body=f"Click the link to reset your password: {reset_url}\nThis link expires in 1 hour.",
+                       sender=current_app.config['MAIL_USERNAME'])
 
     flash("📧 A password reset link has been sent to your email!", "info")
-    return redirect(url_for("login"))
+    return redirect(url_for("main.login"))
 
-@app.route("/reset/<token>", methods=["GET", "POST"])
+@main.route("/reset/<token>", methods=["GET", "POST"])
 def reset_token(token):
     try:
-        email = s.loads(token, salt="reset-token", max_age=3600)  # expires in 1 hour
+        email = token_serializer().loads(token, salt="reset-token", max_age=3600)  # expires in 1 hour
     except (SignatureExpired, BadSignature):
         flash("❌ Reset link is invalid or expired.", "danger")
-        return redirect(url_for("login"))
+        return redirect(url_for("main.login"))
 
     if request.method == "POST":
         new_password = request.form.get("password")
@@ -301,66 +641,66 @@ def reset_token(token):
             user.password = hashed_pw
             db.session.commit()
             flash("✅ Your password has been reset! Please log in.", "success")
-            return redirect(url_for("login"))
+            return redirect(url_for("main.login"))
         else:
             flash("❌ User not found.", "danger")
-            return redirect(url_for("login"))
+            return redirect(url_for("main.login"))
 
     return render_template("reset.html", token=token)
         
-@app.route("/profile")
+@main.route("/profile")
 def profile():
     if "user_id" not in session:
         flash("⚠️ Please log in first.", "warning")
-        return redirect(url_for("login"))
+        return redirect(url_for("main.login"))
     
-    user = User.query.get(session["user_id"])
+    user = get_current_user()
     return render_template("profile-page.html", username=session.get("username"), user=user)
 
-@app.route("/update_username", methods=["POST"])
+@main.route("/update_username", methods=["POST"])
 def update_username():
     new_username = request.form.get("nickname")
     if not new_username or not new_username.strip():
         flash("❌ Username cannot be empty.", "danger")
-        return redirect(url_for("profile"))
+        return redirect(url_for("main.profile"))
 
-    user = User.query.get(session["user_id"])
+    user = get_current_user()
     user.username = new_username
     db.session.commit()
 
     session["username"] = new_username
     flash("✅ Username updated!", "success")
-    return redirect(url_for("profile"))
+    return redirect(url_for("main.profile"))
 
-@app.route("/delete_profile", methods=["POST"])
+@main.route("/delete_profile", methods=["POST"])
 def delete_profile():
-    user = User.query.get(session["user_id"])
+    user = get_current_user()
     if user:
-        
-        Card.query.filter_by(user_id=user.id).delete()
-        db.session.delete(user)
+        unused, card_tags = remove_user(user)
         db.session.commit()
+        page_cache.invalidate("feed", *card_tags)
+        storage.remove_files(db.session, current_app.static_folder, unused)
         session.clear()  
         flash("🗑️ Your profile and all your cards have been deleted.", "success")
-        return redirect(url_for("index"))
+        return redirect(url_for("main.index"))
     else:
         flash("❌ User not found.", "danger")
-        return redirect(url_for("profile"))
+        return redirect(url_for("main.profile"))
 
 
 
-@app.route("/logout")
+@main.route("/logout")
 def logout():
     session.clear()
     flash("You have been logged out.", "info")
-    return redirect(url_for("index"))
+    return redirect(url_for("main.index"))
 
-@app.route("/create", methods=["GET", "POST"])
+@main.route("/create", methods=["GET", "POST"])
 def create():
 
     if "user_id" not in session:  
         flash("⚠️ You must be logged in to create a card!", "warning")
-        return redirect(url_for("login"))
+        return redirect(url_for("main.login"))
 
     pre_lat = request.args.get("lat")
     pre_lng = request.args.get("lng")
@@ -377,6 +717,7 @@ def create():
 
             new_card = Card(
                 to_name=to_name,
+                from_name=from_name,
                 location=location,
                 message=message,
                 user_id=session["user_id"],  
@@ -397,35 +738,34 @@ def create():
                 return redirect(request.url)
             for photo in photos:
                 if photo and photo.filename and allowed_file(photo.filename, "image"):
-                    filename = secure_filename(photo.filename)
-                    save_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-                    base, ext = os.path.splitext(filename)
-                    counter = 1
-                    while os.path.exists(save_path):
-                        filename = f"{base}_{counter}{ext}"
-                        save_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-                        counter += 1
-                    photo.save(save_path)
-                    db_photo = Photo(card_id=new_card.id, file_path=f"uploads/{filename}")
+                    photo.filename = secure_filename(photo.filename)
+                    file_path = storage.save_upload(photo, current_app.static_folder)
+                    storage.acquire(db.session, file_path)
+                    db_photo = Photo(card_id=new_card.id, file_path=file_path)
                     db.session.add(db_photo)
 
             # Video
             video_file = request.files.get("video")
             if video_file and video_file.filename and allowed_file(video_file.filename, "video"):
-                filename = secure_filename(video_file.filename)
-                save_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-                base, ext = os.path.splitext(filename)
-                counter = 1
-                while os.path.exists(save_path):
-                    filename = f"{base}_{counter}{ext}"
-                    save_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-                    counter += 1
-                video_file.save(save_path)
-                new_card.video = f"uploads/{filename}"
+                video_file.filename = secure_filename(video_file.filename)
+                new_card.video = storage.save_upload(video_file, current_app.static_folder)
+                storage.acquire(db.session, new_card.video)
 
             db.session.commit()
+
+            # thumbnails, srcset sizes and video posters are made after we respond
+            for db_photo in new_card.photos:
+                media.submit(process_photo_job, db_photo.id)
+            if new_card.video:
+                media.submit(process_video_job, new_card.id)
+
+            # the page's script uploads a selected video in chunks once it has the card id
+            if request.accept_mimetypes.best == "application/json":
+                return jsonify({"id": new_card.id,
+                                "video_upload_url": url_for("main.create_video_upload", card_id=new_card.id)}), 201
+
             flash("Story submitted successfully!", "success")
-            return redirect(url_for("index"))
+            return redirect(url_for("main.index"))
 
         except Exception as e:
             db.session.rollback()
@@ -433,159 +773,450 @@ def create():
 
     return render_template("create.html", pre_lat=pre_lat, pre_lng=pre_lng)
 
-@app.route("/card/<int:card_id>")
-def view_card(card_id):
+# ---------- Resumable video uploads ----------
+def tus_response(body="", status=204, **headers):
+    response = current_app.response_class(body, status=status)
+    response.headers["Tus-Resumable"] = uploads.TUS_VERSION
+    response.headers["Cache-Control"] = "no-store"
+    for name, value in headers.items():
+        response.headers[name.replace("_", "-")] = str(value)
+    return response
+
+def get_own_upload(upload_id):
+    upload = VideoUpload.query.get_or_404(upload_id)
+    if upload.user_id != session.get("user_id"):
+        return None
+    return upload
+
+def expire_stale_uploads(max_age=timedelta(days=1)):
+    for upload in VideoUpload.query.filter(VideoUpload.created < datetime.utcnow() - max_age):
+        if os.path.exists(upload.partial_path):
+            os.remove(upload.partial_path)
+        db.session.delete(upload)
+
+@main.route("/card/<int:card_id>/video/uploads", methods=["POST"])
+def create_video_upload(card_id):
     card = Card.query.get_or_404(card_id)
+    if "user_id" not in session or card.user_id != session["user_id"]:
+        return tus_response("Not your card", 403)
+    # a video goes live with its card, so it can only be added while the card awaits moderation
+    if card.status != "pending":
+        return tus_response("Only cards awaiting review can get a new video", 409)
+
+    try:
+        length = int(request.headers.get("Upload-Length", ""))
+        metadata = uploads.parse_metadata(request.headers.get("Upload-Metadata"))
+    except ValueError:
+        return tus_response("Upload-Length must be an integer", 400)
+    except uploads.UploadError as e:
+        return tus_response(str(e), e.status)
+    filename = secure_filename(metadata.get("filename", ""))
+    if not filename or not allowed_file(filename, "video"):
+        return tus_response("Unsupported video type", 415)
+    if not 0 < length <= current_app.config["VIDEO_MAX_SIZE"]:
+        return tus_response("Video is too large", 413, Tus_Max_Size=current_app.config["VIDEO_MAX_SIZE"])
+
+    expire_stale_uploads()
+    upload = VideoUpload(card_id=card.id, user_id=session["user_id"], filename=filename, length=length)
+    db.session.add(upload)
+    db.session.commit()
+    open(upload.partial_path, "wb").close()
+    return tus_response("", 201, Location=url_for("main.video_upload", upload_id=upload.id), Upload_Offset=0)
+
+@main.route("/uploads/<upload_id>", methods=["HEAD", "PATCH", "DELETE"])
+def video_upload(upload_id):
+    upload = get_own_upload(upload_id)
+    if upload is None:
+        return tus_response("Not your upload", 403)
+
+    if request.method == "HEAD":
+        return tus_response("", 200, Upload_Offset=upload.offset, Upload_Length=upload.length)
+
+    if request.method == "DELETE":
+        if os.path.exists(upload.partial_path):
+            os.remove(upload.partial_path)
+        db.session.delete(upload)
+        db.session.commit()
+        return tus_response()
+
+    if request.content_type != "application/offset+octet-stream":
+        return tus_response("Content-Type must be application/offset+octet-stream", 415)
+    if request.headers.get("Upload-Offset", type=int) != upload.offset:
+        return tus_response("Upload-Offset does not match", 409, Upload_Offset=upload.offset)
+
+    try:
+        new_offset = uploads.write_chunk(upload.partial_path, upload.offset, upload.length,
+                                         request.stream, request.headers.get("Upload-Checksum"))
+    except uploads.UploadError as e:
+        return tus_response(str(e), e.status, Upload_Offset=upload.offset)
+
+    # only move the offset forward if no other request did in the meantime
+    moved = VideoUpload.query.filter_by(id=upload.id, offset=upload.offset).update({"offset": new_offset})
+    if not moved:
+        db.session.rollback()
+        return tus_response("Upload-Offset does not match", 409)
+
+    if new_offset == upload.length:
+        attach_uploaded_video(upload)
+    db.session.commit()
+    return tus_response(Upload_Offset=new_offset)
+
+def attach_uploaded_video(upload):
+    """Move a finished upload into the blob store and set it as its card's video"""
+    card = db.session.get(Card, upload.card_id)
+    partial_path = upload.partial_path
+    ext = os.path.splitext(upload.filename)[1]
+    with open(partial_path, "rb") as f:
+        video_path = storage.store_stream(f, current_app.static_folder, ext)
+    storage.acquire(db.session, video_path)
+
+    unused = []
+    if card.video and storage.release(db.session, card.video):
+        unused += [card.video, card.video_poster] if card.video_poster else [card.video]
+    card.video = video_path
+    card.video_poster = None
+    # approved while the upload was in progress: the new video has to be reviewed too
+    was_public = card.status != "pending"
+    card.status = "pending"
+    db.session.delete(upload)
+    db.session.commit()
+    page_cache.invalidate(*(["feed"] if was_public else []), f"card:{card.id}")
+
+    os.remove(partial_path)
+    storage.remove_files(db.session, current_app.static_folder, unused)
+    media.submit(process_video_job, card.id)
+
+@main.route("/card/<int:card_id>")
+@page_cache.cached("card:{card_id}")
+def view_card(card_id):
+    card = read_db().get(Card, card_id, options=[selectinload(Card.photos)]) or abort(404)
     return render_template("card_detail.html", card=card)
 
+# ---------- Media ----------
+@main.route("/media/<path:file_path>")
+def media_file(file_path):
+    """Uploaded photos and videos, with Range requests, ETags and long caching for hashed names"""
+    if not storage.is_upload_path(file_path):
+        abort(404)
+    immutable = storage.is_content_addressed(file_path)
+
+    accel_prefix = current_app.config.get("MEDIA_ACCEL_REDIRECT")
+    if accel_prefix:
+        # the front proxy does the transfer, ranges and all
+        response = current_app.response_class()
+        response.headers["X-Accel-Redirect"] = accel_prefix.rstrip("/") + "/" + file_path
+    else:
+        # conditional=True answers Range (206) and If-None-Match / If-Modified-Since (304);
+        # full responses go through wsgi.file_wrapper, i.e. sendfile() on servers that support it
+        response = send_from_directory(current_app.static_folder, file_path, conditional=True, etag=True,
+                                       max_age=31536000 if immutable else 3600)
+
+    if immutable:
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
 # Spotify search
-@app.route("/search")
+@main.route("/search")
+@rate_limiter.limit("search")
 def search():
-    query = request.args.get("q")
-    token = get_token()
-    headers = {"Authorization": f"Bearer {token}"}
-    response = requests.get(
-        "https://api.spotify.com/v1/search",
-        headers=headers,
-        params={"q": query, "type": "track", "limit": 5}
-    )
-    return jsonify(response.json())
+    import requests
 
-@app.route("/contacts")
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"tracks": {"items": []}})
+    try:
+        return jsonify(get_spotify().search_tracks(query))
+    except requests.RequestException as e:
+        return jsonify({"error": f"Spotify search failed: {e}"}), 502
+
+@main.route("/contacts")
 def contacts():
     return render_template("contacts.html")
 
 # ---------------- Admin Routes ---------------- #
-def serialize_card(card):
-    return {
+def serialize_card(card, photos=True):
+    """Plain-data card for list templates and JSON. Load the card with
+    selectinload(Card.photos) so building it never triggers a lazy load,
+    or pass photos=False to leave out thumb and photo_count."""
+    data = {
         "id": card.id,
         "to_name": card.to_name,
+        "from_name": card.from_name,
         "message": card.message,
         "lat": card.lat,
         "lng": card.lng,
-        "location": card.location
+        "location": card.location,
+        "song": card.song,
+        "status": card.status,
+        "created": card.created.isoformat() if card.created else None,
     }
-
-@app.route("/admin")
+    if photos:
+        first = card.photos[0] if card.photos else None
+        data["photo_count"] = len(card.photos)
+        data["thumb"] = (first.variant_data.get("thumb") or first.file_path) if first else None
+    return data
+
+def first_pages_by_status(per_page=ADMIN_PAGE_SIZE):
+    """First page of cards for every status, fetched in a single windowed query"""
+    rank = func.row_number().over(
+        partition_by=Card.status,
+        order_by=(Card.created.desc(), Card.id.desc())
+    ).label("rank")
+    ranked = db.session.query(Card, rank).subquery()
+    ranked_card = aliased(Card, ranked)
+    rows = (db.session.query(ranked_card)
+            .options(selectinload(ranked_card.photos))
+            .filter(ranked.c.rank <= per_page + 1)
+            .order_by(ranked.c.status, ranked.c.rank)
+            .all())
+
+    by_status = {status: [] for status in CARD_STATUSES}
+    for card in rows:
+        if card.status in by_status:
+            by_status[card.status].append(card)
+
+    pages = {}
+    for status, cards in by_status.items():
+        next_cursor = encode_cursor(cards[per_page - 1]) if len(cards) > per_page else None
+        pages[status] = {"cards": [serialize_card(c) for c in cards[:per_page]], "next_cursor": next_cursor}
+    return pages
+
+@main.route("/admin")
+@admin_required
 def admin_dashboard():
-    
-    user = User.query.get(session["user_id"])
-
-    pending = Card.query.filter_by(status="pending").all()
-    approved = Card.query.filter_by(status="approved").all()
-    rejected = Card.query.filter_by(status="rejected").all()
-    archived = Card.query.filter_by(status="archived").all()
-
-    
-    users = User.query.all()
-    user_data = []
-    for u in users:
-        total_cards = Card.query.filter_by(user_id=u.id).count()  
-        user_data.append({
-            "id": u.id,
-            "username": u.username,
-            "email": u.email,
-            "total_cards": total_cards
-        })
-
+    pages = first_pages_by_status()
+
+    users_page = max(request.args.get("users_page", 1, type=int), 1)
+    users = (User.query
+             .order_by(User.id)
+             .offset((users_page - 1) * USERS_PER_PAGE)
+             .limit(USERS_PER_PAGE + 1)
+             .all())
+    totals = card_stats.user_counts(db.session.connection(), [u.id for u in users[:USERS_PER_PAGE]])
+    user_data = [{
+        "id": u.id,
+        "username": u.username,
+        "email": u.email,
+        "total_cards": sum(totals.get(u.id, {}).values())
+    } for u in users[:USERS_PER_PAGE]]
 
     return render_template("admin.html",
-        pending=[serialize_card(c) for c in pending],
-        approved=[serialize_card(c) for c in approved],
-        rejected=[serialize_card(c) for c in rejected],
-        archived=[serialize_card(c) for c in archived],
-        user_data=user_data 
+        pages=pages,
+        user_data=user_data,
+        users_page=users_page,
+        more_users=len(users) > USERS_PER_PAGE
     )
 
-
-@app.route("/admin/card/<int:card_id>/approve", methods=["POST"])
+@main.route("/admin/cards/<status>")
+@admin_required
+def admin_cards_page(status):
+    """Next page of one dashboard section, for the "Load more" buttons"""
+    if status not in CARD_STATUSES:
+        return jsonify({"error": "unknown status"}), 404
+    cards, next_cursor = paginate_cards(Card.query.options(selectinload(Card.photos)).filter_by(status=status),
+                                        request.args.get("before"), ADMIN_PAGE_SIZE)
+    cards = [serialize_card(c) for c in cards]
+    html = "".join(render_template("admin_card.html", card=card, status=status) for card in cards)
+    return jsonify({"html": html, "cards": cards, "next_cursor": next_cursor})
+
+
+@main.route("/admin/export.<fmt>")
+def export_cards(fmt):
+    """Download every card (or ?status=...) as NDJSON or CSV, streamed from the database cursor"""
+    if not current_user_is_admin():
+        return jsonify({"error": "admins only"}), 403
+    if fmt not in transfer.FORMATS:
+        abort(404)
+    status = request.args.get("status")
+    if status not in CARD_STATUSES:
+        status = None
+    engine = current_app.extensions["read_engine"] or db.engine
+
+    def generate():
+        with engine.connect() as conn:
+            yield from transfer.serialize(transfer.export_rows(conn, status), fmt)
+
+    return current_app.response_class(stream_with_context(generate()), mimetype=transfer.FORMATS[fmt],
+                              headers={"Content-Disposition": f"attachment; filename=cards.{fmt}"})
+
+
+@main.route("/admin/card/<int:card_id>/approve", methods=["POST"])
+@admin_required
 def approve_card(card_id):
     card = Card.query.get_or_404(card_id)
     card.status = "approved"
     db.session.commit()
-    return redirect(url_for("admin_dashboard"))
+    page_cache.invalidate("feed", f"card:{card_id}")
+    return redirect(url_for("main.admin_dashboard"))
 
-@app.route("/admin/card/<int:card_id>/reject", methods=["POST"])
+@main.route("/admin/card/<int:card_id>/reject", methods=["POST"])
+@admin_required
 def reject_card(card_id):
     card = Card.query.get_or_404(card_id)
     card.status = "rejected"
     db.session.commit()
-    return redirect(url_for("admin_dashboard"))
+    page_cache.invalidate("feed", f"card:{card_id}")
+    return redirect(url_for("main.admin_dashboard"))
 
-@app.route("/admin/card/<int:card_id>/archive", methods=["POST"])
+@main.route("/admin/card/<int:card_id>/archive", methods=["POST"])
+@admin_required
 def archive_card(card_id):
     card = Card.query.get_or_404(card_id)
     card.status = "archived"
     db.session.commit()
-    return redirect(url_for("admin_dashboard"))
-
-@app.route("/delete/<int:card_id>", methods=["POST"])
-def delete_card(card_id):
-    card = Card.query.get_or_404(card_id)
-
+    page_cache.invalidate("feed", f"card:{card_id}")
+    return redirect(url_for("main.admin_dashboard"))
+
+def moderation_filter(payload):
+    """WHERE clause for a bulk moderation request: explicit ids, or a filter on status/location/user/age"""
+    if "ids" in payload:
+        ids = payload["ids"]
+        if (not isinstance(ids, list) or not ids or len(ids) > MAX_BULK_IDS
+                or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids)):
+            raise ValueError(f"ids must be a list of 1 to {MAX_BULK_IDS} card ids")
+        return [Card.id.in_(ids)]
+
+    criteria = payload.get("filter")
+    if not isinstance(criteria, dict) or criteria.get("status") not in CARD_STATUSES:
+        raise ValueError("give either ids or a filter with a status")
+    conditions = [Card.status == criteria["status"]]
+    if criteria.get("location"):
+        conditions.append(Card.location == criteria["location"])
+    if criteria.get("user_id") is not None:
+        conditions.append(Card.user_id == criteria["user_id"])
+    if criteria.get("created_before"):
+        try:
+            conditions.append(Card.created < datetime.fromisoformat(criteria["created_before"]))
+        except (TypeError, ValueError):
+            raise ValueError("created_before must be an ISO date")
+    return conditions
+
+@main.route("/admin/cards/moderate", methods=["POST"])
+def moderate_cards():
+    """Approve, reject or archive many cards in one UPDATE, returns a JSON summary"""
+    if not current_user_is_admin():
+        return jsonify({"error": "admins only"}), 403
+    payload = request.get_json(silent=True) or {}
+    new_status = MODERATION_ACTIONS.get(payload.get("action"))
+    if new_status is None:
+        return jsonify({"error": f"action must be one of {', '.join(MODERATION_ACTIONS)}"}), 400
+    try:
+        conditions = moderation_filter(payload)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    updated = db.session.execute(
+        update(Card)
+        .where(*conditions, Card.status.is_distinct_from(new_status))
+        .values(status=new_status)
+        .returning(Card.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    db.session.commit()
+    if updated:
+        page_cache.invalidate("feed", *(f"card:{card_id}" for card_id in updated))
+
+    summary = {"action": payload["action"], "status": new_status, "updated": len(updated), "ids": updated}
+    if "ids" in payload:
+        # already in the target status, or no such card
+        summary["skipped"] = sorted(set(payload["ids"]) - set(updated))
+    return jsonify(summary)
+
+def remove_card(card):
+    """Delete a card and its photos, returning the stored files that are no longer referenced"""
+    unused = []
     for photo in card.photos:
-        photo_path = os.path.join(app.config["UPLOAD_FOLDER"], os.path.basename(photo.file_path))
-        if os.path.exists(photo_path):
-            os.remove(photo_path)
+        if storage.release(db.session, photo.file_path):
+            unused += [photo.file_path] + variant_paths(photo.variants)
         db.session.delete(photo)
-
+    if card.video and storage.release(db.session, card.video):
+        unused.append(card.video)
+        if card.video_poster:
+            unused.append(card.video_poster)
     db.session.delete(card)
+    return unused
+
+def remove_user(user):
+    """Delete a user and all their cards. Returns (files no longer referenced, the cards' cache tags)"""
+    unused = []
+    card_tags = []
+    for card in Card.query.options(selectinload(Card.photos)).filter_by(user_id=user.id):
+        card_tags.append(f"card:{card.id}")
+        unused += remove_card(card)
+    # Card has no relationship to User to order the deletes by, so send the card deletes
+    # before the user's; with foreign keys on, SQLite rejects the user row while cards remain
+    db.session.flush()
+    db.session.delete(user)
+    return unused, card_tags
+
+@main.route("/delete/<int:card_id>", methods=["POST"])
+@admin_required
+def delete_card(card_id):
+    card = Card.query.get_or_404(card_id)
+
+    unused = remove_card(card)
     db.session.commit()
+    page_cache.invalidate("feed", f"card:{card_id}")
+    storage.remove_files(db.session, current_app.static_folder, unused)
     flash("🗑️ Card deleted successfully.", "success")
-    return redirect(url_for("admin_dashboard"))
+    return redirect(url_for("main.admin_dashboard"))
 
 
-@app.route("/edit/<int:card_id>", methods=["GET", "POST"])
+@main.route("/edit/<int:card_id>", methods=["GET", "POST"])
+@admin_required
 def edit_card(card_id):
     card = Card.query.get_or_404(card_id)
     if request.method == "POST":
         card.to_name = request.form["to_name"]
         card.location = request.form["location"]
         card.message = request.form["message"]
-        card.video = request.form["video"]
+        unused = []
+        # the video can only be taken off here; new ones come through the upload flow
+        if request.form.get("remove_video") and card.video:
+            if storage.release(db.session, card.video):
+                unused += [card.video, card.video_poster] if card.video_poster else [card.video]
+            card.video = card.video_poster = None
         card.from_name = request.form["from_name"]
         card.lat = request.form["lat"]
         card.lng = request.form["lng"]
         card.status = "approved"
         db.session.commit()
-        return redirect(url_for("admin_dashboard"))
+        page_cache.invalidate("feed", f"card:{card_id}")
+        storage.remove_files(db.session, current_app.static_folder, unused)
+        return redirect(url_for("main.admin_dashboard"))
     return render_template("edit.html", card=card)
 
-@app.route("/user/<int:user_id>")
+@main.route("/user/<int:user_id>")
 def view_user_profile(user_id):
-    current_user = User.query.get(session.get("user_id"))
     user = User.query.get_or_404(user_id)
     return render_template("profile-page.html", user=user, username=user.username)
 
 
-@app.route("/admin/delete_user/<int:user_id>", methods=["POST"])
+@main.route("/admin/delete_user/<int:user_id>", methods=["POST"])
+@admin_required
 def admin_delete_user(user_id):
 
     user = User.query.get(user_id)
     if user:
-       
-        Card.query.filter_by(user_id=user.id).delete()
-        db.session.delete(user)
+        unused, card_tags = remove_user(user)
         db.session.commit()
+        page_cache.invalidate("feed", *card_tags)
+        storage.remove_files(db.session, current_app.static_folder, unused)
         flash(f"🗑️ User {user.username} and all their cards have been deleted.")
     else:
         flash("❌ User not found.", "danger")
 
-    return redirect(url_for("admin_dashboard"))
+    return redirect(url_for("main.admin_dashboard"))
 
 
 
 
-@app.context_processor
+@main.app_context_processor
 def inject_user():
-    user_id = session.get("user_id")
-    if user_id:
-        user = User.query.get(user_id)
-        return dict(current_user=user)
-    return dict(current_user=None)
+    # lazy, so templates that never touch them cost no query
+    return dict(current_user=LocalProxy(get_current_user), is_admin=LocalProxy(current_user_is_admin),
+                google_login="google" in current_app.blueprints)
 
 # ---------- Run ----------
 if __name__ == "__main__":
-    with app.app_context():
-        db.create_all()
-    app.run(debug=True)
+    create_app().run(debug=True)
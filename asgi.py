@@ -0,0 +1,135 @@
+"""ASGI entry point: the Spotify search runs on the event loop, everything else is the Flask app.
+
+    uvicorn asgi:app --workers 2
+
+A /search request spends nearly all of its time waiting for Spotify, and under
+the WSGI server every one of those waits holds a worker thread. Here it is a
+coroutine on one pooled httpx.AsyncClient, so a slow upstream no longer starves
+the page views. All other routes (the database ones included) are unchanged
+and run in a thread pool of ASGI_WSGI_THREADS threads (default 32).
+
+Needs httpx, asgiref and uvicorn, none of which the WSGI deployment uses.
+"""
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import httpx
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from itsdangerous import BadSignature
+from werkzeug.http import parse_cookie
+
+from app import create_app, get_spotify, rate_limiter
+from ratelimit import client_key, retry_after_header
+from spotify import AsyncSpotifyClient
+
+
+class ThreadedWsgiToAsgiInstance(WsgiToAsgiInstance):
+    # asgiref runs every WSGI call on one shared thread by default (thread_sensitive),
+    # which would serialise the whole Flask app; give each call its own pool thread
+    run_wsgi_app = sync_to_async(WsgiToAsgiInstance.__dict__["run_wsgi_app"].func, thread_sensitive=False)
+
+
+class ThreadedWsgiToAsgi(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        await ThreadedWsgiToAsgiInstance(self.wsgi_application)(scope, receive, send)
+
+
+async def send_json(send, payload, status=200, headers=()):
+    body = json.dumps(payload).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                    *headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AsyncApp:
+    """Routes a few I/O-bound paths to coroutines and hands the rest to Flask"""
+
+    def __init__(self, flask_app, threads=32):
+        self.flask = flask_app
+        self.wsgi = ThreadedWsgiToAsgi(flask_app)
+        self.threads = threads
+        self.spotify = None
+        self.routes = {("GET", "/search"): self.search}
+
+    def get_spotify(self):
+        # created on first use, inside the server's event loop
+        if self.spotify is None:
+            with self.flask.app_context():
+                spotify = get_spotify()
+            self.spotify = AsyncSpotifyClient(
+                spotify.client_id,
+                spotify.client_secret,
+                accounts_url=spotify.accounts_url,
+                api_url=spotify.api_url,
+                cache=spotify.cache,
+                timeout=spotify.timeout,
+            )
+        return self.spotify
+
+    def session_user_id(self, scope):
+        """user_id from Flask's signed session cookie, None when absent or tampered with"""
+        headers = dict(scope["headers"])
+        cookie = parse_cookie(headers.get(b"cookie", b"").decode("latin-1")).get(
+            self.flask.config["SESSION_COOKIE_NAME"])
+        serializer = self.flask.session_interface.get_signing_serializer(self.flask)
+        if not cookie or serializer is None:
+            return None
+        max_age = int(self.flask.permanent_session_lifetime.total_seconds())
+        try:
+            return serializer.loads(cookie, max_age=max_age).get("user_id")
+        except BadSignature:
+            return None
+
+    async def rate_limited(self, name, scope, send):
+        """Same token buckets as the Flask routes; sends the 429 and returns True when empty"""
+        key = client_key(self.session_user_id(scope), (scope.get("client") or ("",))[0])
+        if rate_limiter.store(self.flask).blocking:
+            allowed, retry_after = await asyncio.to_thread(rate_limiter.hit, name, key, self.flask)
+        else:
+            allowed, retry_after = rate_limiter.hit(name, key, self.flask)
+        if not allowed:
+            await send_json(send, {"error": "Too many requests, slow down"}, 429,
+                            [(b"retry-after", retry_after_header(retry_after).encode())])
+        return not allowed
+
+    async def search(self, scope, receive, send):
+        if await self.rate_limited("search", scope, send):
+            return
+        query = parse_qs(scope["query_string"].decode("latin-1")).get("q", [""])[0].strip()
+        if not query:
+            return await send_json(send, {"tracks": {"items": []}})
+        try:
+            return await send_json(send, await self.get_spotify().search_tracks(query))
+        except httpx.HTTPError as e:
+            return await send_json(send, {"error": f"Spotify search failed: {e}"}, 502)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(self.threads))
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.spotify is not None:
+                    await self.spotify.aclose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        handler = self.routes.get((scope.get("method"), scope.get("path")))
+        if handler is None:
+            return await self.wsgi(scope, receive, send)
+        return await handler(scope, receive, send)
+
+
+app = AsyncApp(create_app(), threads=int(os.getenv("ASGI_WSGI_THREADS", 32)))
@@ -0,0 +1,188 @@
+"""Page-view latency while /search waits on a slow Spotify, WSGI threads vs the ASGI app.
+
+Both modes get the same number of threads. The WSGI server runs every request
+on a fixed pool of them; the ASGI app (asgi.py under uvicorn) runs /search on
+the event loop and only the Flask routes on its pool. Several clients keep
+searching (every query unique, so nothing is cached) while one more client
+loads the feed, and the feed's latency is what the slow upstream costs.
+
+    python benchmarks/bench_asgi.py
+    python benchmarks/bench_asgi.py --spotify-latency 2 --searchers 64 --threads 16 --output asgi.json
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from bench_routes import configure_environment, percentile, seed  # noqa: E402
+from stubs import SMTPStub, SpotifyStub  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_wsgi(app, threads):
+    from werkzeug.serving import BaseWSGIServer
+
+    class PooledWSGIServer(BaseWSGIServer):
+        """werkzeug's server with a fixed thread pool, like gunicorn --threads"""
+        pool = ThreadPoolExecutor(threads)
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self.process_request_thread, request, client_address)
+
+        def process_request_thread(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    server = PooledWSGIServer("127.0.0.1", 0, app)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def stop():
+        server.shutdown()
+        server.pool.shutdown(cancel_futures=True)
+    return f"http://127.0.0.1:{server.server_port}", stop
+
+
+def start_asgi(threads):
+    import uvicorn
+
+    os.environ["ASGI_WSGI_THREADS"] = str(threads)
+    from asgi import app
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning",
+                                           backlog=4096, timeout_keep_alive=30))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    def stop():
+        server.should_exit = True
+    return f"http://127.0.0.1:{port}", stop
+
+
+def run_load(base_url, searchers, duration, page_timeout):
+    """Searchers hammer /search while one client loads the feed in a loop"""
+    stop = threading.Event()
+    counter = itertools.count()
+    searches, search_errors = [], []
+    lock = threading.Lock()
+
+    def searcher():
+        session = requests.Session()
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                status = session.get(f"{base_url}/search", params={"q": f"song {next(counter)}"},
+                                     timeout=30).status_code
+            except requests.RequestException:
+                status = None
+            with lock:
+                searches.append(time.perf_counter() - started)
+                if status != 200:
+                    search_errors.append(status)
+
+    pages, page_timeouts = [], 0
+    session = requests.Session()
+    with ThreadPoolExecutor(searchers) as pool:
+        for _ in range(searchers):
+            pool.submit(searcher)
+        time.sleep(0.5)  # let every searcher get a request in flight
+        with lock:
+            searches.clear()
+        started = time.perf_counter()
+        while time.perf_counter() - started < duration:
+            request_started = time.perf_counter()
+            try:
+                session.get(f"{base_url}/", timeout=page_timeout)
+                pages.append(time.perf_counter() - request_started)
+            except requests.Timeout:
+                page_timeouts += 1
+        wall = time.perf_counter() - started
+        with lock:
+            finished = len(searches)
+        stop.set()
+
+    cuts = statistics.quantiles(pages, n=100, method="inclusive") if len(pages) > 1 else []
+    return {
+        "page_views": len(pages),
+        "page_timeouts": page_timeouts,
+        "page_p50_ms": percentile(cuts, 50),
+        "page_p95_ms": percentile(cuts, 95),
+        "page_max_ms": max(pages, default=0) * 1000,
+        "searches": finished,
+        "search_errors": len(search_errors),
+        "search_rps": finished / wall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--cards", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8, help="worker threads in both modes")
+    parser.add_argument("--searchers", type=int, default=32, help="clients searching concurrently")
+    parser.add_argument("--spotify-latency", type=float, default=1.0, help="seconds per stub search")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load per mode")
+    parser.add_argument("--page-timeout", type=float, default=10.0)
+    parser.add_argument("--modes", default="wsgi,asgi")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    spotify = SpotifyStub(args.spotify_latency).start()
+    smtp = SMTPStub().start()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        configure_environment(tmp, spotify, smtp)
+        from app import create_app, db
+
+        app = create_app()
+
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+        print(f"seeding {args.users} users and {args.cards} cards ...")
+        seed(app, db, args.users, args.cards, random.Random(args.seed))
+
+        for mode in args.modes.split(","):
+            base_url, stop = start_wsgi(app, args.threads) if mode == "wsgi" else start_asgi(args.threads)
+            results[mode] = run_load(base_url, args.searchers, args.duration, args.page_timeout)
+            stop()
+
+    spotify.stop()
+    smtp.stop()
+
+    print(f"{'mode':<6} {'pages':>6} {'timeouts':>8} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} "
+          f"{'search/s':>9} {'errors':>7}")
+    for mode, r in results.items():
+        print(f"{mode:<6} {r['page_views']:6d} {r['page_timeouts']:8d} {r['page_p50_ms']:9.1f} "
+              f"{r['page_p95_ms']:9.1f} {r['page_max_ms']:9.1f} {r['search_rps']:9.1f} {r['search_errors']:7d}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"meta": vars(args), "modes": results}, f, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
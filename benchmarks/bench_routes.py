@@ -0,0 +1,314 @@
+"""Latency, throughput and SQL query counts for the main routes under concurrent load.
+
+Seeds a throwaway database with synthetic users and cards, points Spotify and
+SMTP at local stubs, then fires requests at each route from several threads,
+either through a real local WSGI server (default) or Flask's test client.
+
+    python benchmarks/bench_routes.py
+    python benchmarks/bench_routes.py --users 500 --cards 20000 --requests 500 --concurrency 16
+    python benchmarks/bench_routes.py --routes index,search --output before.json
+    python benchmarks/bench_routes.py --output after.json --compare before.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import queue
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from stubs import SMTPStub, SpotifyStub  # noqa: E402
+
+NAMES = ["Aisyah", "Ahmad", "Siti", "Muthu", "Wei Ling", "Jonathan", "Priya", "Hafiz",
+         "Nurul", "Kumar", "Mei", "Daniel", "Farah", "Arjun", "Zhi Hao", "Amirah"]
+PLACES = ["FCI", "FOM", "FCM", "Library", "Stadium", "DTC", "Central Plaza", "Masjid"]
+WORDS = ["thank", "you", "for", "the", "coffee", "after", "class", "remember", "when", "we",
+         "missed", "bus", "rain", "exam", "week", "miss", "our", "talks", "see", "soon"]
+SONGS = ["lofi", "taylor", "coldplay", "sheila", "anuar", "yuna", "bts", "adele"]
+# MMU Cyberjaya, roughly
+CAMPUS = (2.9235, 2.9305, 101.6375, 101.6445)
+PASSWORD = "bench-password"
+
+
+def configure_environment(tmp, spotify, smtp):
+    """Everything the app reads at import time, pointed at temp files and the stubs"""
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+        "SPOTIFY_CLIENT_ID": "bench", "SPOTIFY_CLIENT_SECRET": "bench",
+        "SPOTIFY_ACCOUNTS_URL": spotify.url, "SPOTIFY_API_URL": spotify.url,
+        "MAIL_SERVER": "127.0.0.1", "MAIL_PORT": str(smtp.port), "MAIL_USE_TLS": "0",
+        "MAIL_USERNAME": "bench@example.com", "MAIL_PASSWORD": "",
+        # the benchmark measures query counts itself, don't log every busy request
+        "MAX_QUERIES_PER_REQUEST": "1000000",
+        # every benchmark client comes from 127.0.0.1 and would share one bucket
+        "RATE_LIMIT_ENABLED": "0",
+    })
+
+
+def seed(app, db, users, cards, rng):
+    from flask_migrate import upgrade
+    from werkzeug.security import generate_password_hash
+    from sqlalchemy import text
+
+    import transfer
+    from app import init_migrations
+
+    init_migrations(app)
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, "migrations"))
+        # hashing is deliberately slow, every synthetic user shares one hash
+        hashed = generate_password_hash(PASSWORD)
+        with db.engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO user (username, email, password, is_admin)
+                VALUES (:username, :email, :password, :is_admin)
+            """), [{"username": f"user{i}", "email": f"user{i}@example.com",
+                    "password": hashed, "is_admin": i == 0} for i in range(users)])
+
+            now = datetime.utcnow()
+            records = ({
+                "to_name": f"{rng.choice(NAMES)} {rng.randint(1, 999)}",
+                "from_name": rng.choice(NAMES),
+                "location": rng.choice(PLACES),
+                "message": " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 40))),
+                "lat": rng.uniform(CAMPUS[0], CAMPUS[1]),
+                "lng": rng.uniform(CAMPUS[2], CAMPUS[3]),
+                "status": rng.choices(["approved", "pending", "rejected", "archived"], [70, 20, 5, 5])[0],
+                "user_id": rng.randint(1, users),
+                "created": (now - timedelta(minutes=i)).isoformat(),
+                "photos": [],
+            } for i in range(cards))
+            stats = transfer.import_cards(conn, records)
+    return stats
+
+
+class ServerClient:
+    """One keep-alive HTTP connection to the local WSGI server"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.session = requests.Session()
+
+    def get(self, path, **kwargs):
+        return self.session.get(self.base_url + path, allow_redirects=False, **kwargs).status_code
+
+    def post(self, path, data=None, **kwargs):
+        return self.session.post(self.base_url + path, data=data, allow_redirects=False, **kwargs).status_code
+
+
+class TestClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def get(self, path, **kwargs):
+        return self.client.get(path, **kwargs).status_code
+
+    def post(self, path, data=None, **kwargs):
+        return self.client.post(path, data=data, **kwargs).status_code
+
+
+def login(client, user):
+    status = client.post("/login", data={"username": user, "password": PASSWORD})
+    if status != 302:
+        raise RuntimeError(f"login as {user} failed with {status}")
+
+
+def make_routes(app, db, users):
+    """name -> (needs login as, request function)"""
+    with app.app_context():
+        from app import Card, encode_cursor
+        cursors = [encode_cursor(card) for card in
+                   Card.query.filter_by(status="approved").order_by(Card.created.desc()).limit(500)]
+
+    def random_point(rng):
+        return {"lat": rng.uniform(CAMPUS[0], CAMPUS[1]), "lng": rng.uniform(CAMPUS[2], CAMPUS[3])}
+
+    return {
+        # anonymous feed, mostly served from the page cache
+        "index": (None, lambda c, rng: c.get("/")),
+        # older feed pages, mostly cache misses
+        "feed_page": (None, lambda c, rng: c.get(f"/?before={rng.choice(cursors)}")),
+        "search_cards": (None, lambda c, rng: c.get(f"/?q={rng.choice(NAMES)}")),
+        "search": (None, lambda c, rng: c.get(f"/search?q={rng.choice(SONGS)} {rng.randint(1, 50)}")),
+        "location": (None, lambda c, rng: c.post("/location", data=random_point(rng))),
+        "create": ("user1", lambda c, rng: c.post("/create", data=dict(
+            random_point(rng), to_name=rng.choice(NAMES), location=rng.choice(PLACES),
+            message=" ".join(rng.choice(WORDS) for _ in range(20)), song=""))),
+        "admin_dashboard": ("user0", lambda c, rng: c.get("/admin")),
+        "forgot": (None, lambda c, rng: c.post("/forgot", data={"email": f"user{rng.randint(0, users - 1)}@example.com"})),
+    }
+
+
+def percentile(cuts, p):
+    return cuts[p - 1] * 1000 if cuts else 0.0
+
+
+def run_route(name, route, make_client, total, concurrency, seed_value, query_counts):
+    user, call = route
+    # log every client in before the clock starts, so logins don't count
+    clients = queue.Queue()
+    for i in range(concurrency):
+        client = make_client()
+        if user:
+            login(client, user)
+        clients.put((client, random.Random(f"{seed_value}-{name}-{i}")))
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def one(_):
+        client, rng = clients.get()
+        start = time.perf_counter()
+        try:
+            status = call(client, rng)
+        except requests.RequestException:
+            status = None
+        elapsed = time.perf_counter() - start
+        clients.put((client, rng))
+        with lock:
+            latencies.append(elapsed)
+            if status is None or status >= 500:
+                errors.append(status)
+
+    query_counts.clear()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - started
+
+    cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else []
+    counts = list(query_counts)
+    return {
+        "requests": total,
+        "errors": len(errors),
+        "throughput_rps": total / wall,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "p50_ms": percentile(cuts, 50),
+        "p95_ms": percentile(cuts, 95),
+        "p99_ms": percentile(cuts, 99),
+        "queries_mean": statistics.fmean(counts) if counts else 0.0,
+        "queries_max": max(counts, default=0),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_results(results, previous=None):
+    print(f"{'route':<16} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'errors':>7}")
+    for name, r in results.items():
+        line = (f"{name:<16} {r['throughput_rps']:8.1f} {r['p50_ms']:8.2f} {r['p95_ms']:8.2f} "
+                f"{r['p99_ms']:8.2f} {r['queries_mean']:8.1f} {r['errors']:7d}")
+        old = (previous or {}).get(name)
+        if old:
+            change = lambda key: (r[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            line += f"   vs baseline: req/s {change('throughput_rps'):+.0f}%, p95 {change('p95_ms'):+.0f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--cards", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=300, help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--routes", help="comma separated subset of routes")
+    parser.add_argument("--client", choices=["server", "test"], default="server",
+                        help="real local WSGI server over HTTP, or Flask's test client in-process")
+    parser.add_argument("--spotify-latency", type=float, default=0.05, help="seconds per stub search")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    spotify = SpotifyStub(args.spotify_latency).start()
+    smtp = SMTPStub().start()
+    with tempfile.TemporaryDirectory() as tmp:
+        configure_environment(tmp, spotify, smtp)
+        from flask import g
+        from werkzeug.serving import make_server
+        from app import create_app, db
+
+        app = create_app()
+
+        query_counts = []
+
+        @app.after_request
+        def record_query_count(response):
+            query_counts.append(g.get("query_count", 0))
+            return response
+
+        rng = random.Random(args.seed)
+        print(f"seeding {args.users} users and {args.cards} cards ...")
+        seeded = seed(app, db, args.users, args.cards, rng)
+        print(f"seeded in {seeded['seconds']:.2f}s")
+
+        routes = make_routes(app, db, args.users)
+        if args.routes:
+            routes = {name: routes[name] for name in args.routes.split(",")}
+
+        server = None
+        if args.client == "server":
+            logging.getLogger("werkzeug").setLevel(logging.WARNING)
+            server = make_server("127.0.0.1", 0, app, threaded=True)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            base_url = f"http://127.0.0.1:{server.server_port}"
+            make_client = lambda: ServerClient(base_url)
+        else:
+            make_client = lambda: TestClient(app)
+
+        results = {}
+        for name, route in routes.items():
+            results[name] = run_route(name, route, make_client, args.requests, args.concurrency,
+                                      args.seed, query_counts)
+
+        if server:
+            server.shutdown()
+
+    spotify.stop()
+    smtp.stop()
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)["routes"]
+    print_results(results, previous)
+
+    if args.output:
+        report = {
+            "meta": {
+                "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+                "git_revision": git_revision(),
+                "python": platform.python_version(),
+                "sqlite": sqlite3.sqlite_version,
+                "users": args.users, "cards": args.cards, "requests": args.requests,
+                "concurrency": args.concurrency, "client": args.client,
+                "spotify_latency": args.spotify_latency, "seed": args.seed,
+                "spotify_calls": spotify.calls, "mails_received": smtp.received,
+            },
+            "routes": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Compare card search: the old load-everything + SequenceMatcher path against the FTS5 index.
+
+    python benchmarks/bench_search.py            # 10k and 100k cards
+    python benchmarks/bench_search.py 5000
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from difflib import SequenceMatcher
+
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from search_index import init_search_index, search_card_ids  # noqa: E402
+
+NAMES = ["Aisyah", "Ahmad", "Siti", "Muthu", "Wei Ling", "Jonathan", "Priya", "Hafiz",
+         "Nurul", "Kumar", "Mei", "Daniel", "Farah", "Arjun", "Zhi Hao", "Amirah"]
+PLACES = ["FCI", "FOM", "Library", "Stadium", "DTC", "Central Plaza", "Masjid"]
+WORDS = ["thank", "you", "for", "the", "coffee", "after", "class", "remember", "when", "we",
+         "missed", "bus", "rain", "exam", "week", "miss", "our", "talks", "see", "soon"]
+QUERIES = ["aisyah", "jonathan", "wei", "hafz", "nurul", "zhi hao"]
+REPEAT = 5
+
+
+def seed(engine, n):
+    rng = random.Random(n)
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE card (
+                id INTEGER PRIMARY KEY, to_name VARCHAR(50) NOT NULL, from_name VARCHAR(50),
+                location VARCHAR(100) NOT NULL, message TEXT NOT NULL,
+                created DATETIME, status VARCHAR(20)
+            )
+        """))
+        conn.execute(text("CREATE INDEX ix_card_status_created ON card (status, created)"))
+        rows = [{
+            "to_name": f"{rng.choice(NAMES)} {rng.randint(1, 999)}",
+            "from_name": rng.choice(NAMES),
+            "location": rng.choice(PLACES),
+            "message": " ".join(rng.choice(WORDS) for _ in range(20))
+                       + (f" {rng.choice(NAMES)}" if i % 10 == 0 else ""),
+            "created": f"2025-01-01 00:00:{i % 60:02d}",
+            "status": "approved" if i % 4 else "pending",
+        } for i in range(n)]
+        conn.execute(text("""
+            INSERT INTO card (to_name, from_name, location, message, created, status)
+            VALUES (:to_name, :from_name, :location, :message, :created, :status)
+        """), rows)
+    init_search_index(engine)
+
+
+def sequencematcher_search(conn, query):
+    cards = conn.execute(text(
+        "SELECT id, to_name, from_name FROM card WHERE status = 'approved'"
+    )).all()
+    q = query.lower()
+    matched = [c for c in cards if q in c.to_name.lower() or (c.from_name and q in c.from_name.lower())]
+
+    def similarity(card):
+        return max(SequenceMatcher(None, q, card.to_name.lower()).ratio(),
+                   SequenceMatcher(None, q, (card.from_name or "").lower()).ratio())
+    return [c.id for c in sorted(matched, key=similarity, reverse=True)][:12]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        for q in QUERIES:
+            fn(q)
+    return (time.perf_counter() - start) / (REPEAT * len(QUERIES)) * 1000
+
+
+def run(n):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        seed(engine, n)
+        with engine.connect() as conn:
+            old = timed(lambda q: sequencematcher_search(conn, q))
+            new = timed(lambda q: search_card_ids(conn, q, limit=13))
+        engine.dispose()
+    print(f"{n:>8} cards   SequenceMatcher {old:9.2f} ms/query   FTS5 bm25 {new:7.2f} ms/query   "
+          f"x{old / new:.0f}")
+
+
+if __name__ == "__main__":
+    for n in [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]:
+        run(n)
@@ -0,0 +1,103 @@
+"""Read throughput of the card feed query while a writer keeps committing new cards.
+
+Runs the same workload against SQLite's defaults (rollback journal) and against
+the tuned settings from db_config.py (WAL, synchronous=NORMAL, busy timeout, ...).
+
+    python benchmarks/bench_sqlite_concurrency.py [readers] [seconds]
+"""
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db_config import tune_engine  # noqa: E402
+
+SEED_CARDS = 20_000
+FEED_QUERY = text("""
+    SELECT id, to_name, location, message FROM card
+    WHERE status = 'approved' ORDER BY created DESC, id DESC LIMIT 13
+""")
+
+
+def seed(engine):
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE card (
+                id INTEGER PRIMARY KEY, to_name VARCHAR(50), location VARCHAR(100),
+                message TEXT, created DATETIME DEFAULT CURRENT_TIMESTAMP, status VARCHAR(20)
+            )
+        """))
+        conn.execute(text("CREATE INDEX ix_card_status_created ON card (status, created)"))
+        conn.execute(text("""
+            INSERT INTO card (to_name, location, message, status)
+            VALUES (:to_name, 'FCI', :message, 'approved')
+        """), [{"to_name": f"name {i}", "message": "hello " * 40} for i in range(SEED_CARDS)])
+
+
+def writer(engine, stop, stats):
+    while not stop.is_set():
+        try:
+            with engine.begin() as conn:
+                for i in range(20):
+                    conn.execute(text("""
+                        INSERT INTO card (to_name, location, message, status)
+                        VALUES ('new', 'FCI', :message, 'pending')
+                    """), {"message": "hello " * 40})
+                # hold the write transaction open a little, like a request doing more work
+                time.sleep(0.005)
+            stats["writes"] += 1
+        except OperationalError:
+            stats["write_errors"] += 1
+
+
+def reader(engine, stop, latencies, errors):
+    with engine.connect() as conn:
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                conn.execute(FEED_QUERY).all()
+                conn.commit()
+                latencies.append(time.perf_counter() - start)
+            except OperationalError:
+                conn.rollback()
+                errors.append(1)
+
+
+def run(label, tuned, readers, seconds):
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        # timeout=0.1: without a busy handler worth the name, blocked readers fail fast
+        engine = create_engine(url, pool_size=readers + 2, connect_args={"timeout": 0.1})
+        if tuned:
+            tune_engine(engine)
+        seed(engine)
+
+        stop = threading.Event()
+        stats = {"writes": 0, "write_errors": 0}
+        latencies, errors = [], []
+        threads = [threading.Thread(target=writer, args=(engine, stop, stats))]
+        threads += [threading.Thread(target=reader, args=(engine, stop, latencies, errors)) for _ in range(readers)]
+        for t in threads:
+            t.start()
+        time.sleep(seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        engine.dispose()
+
+    p = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+    print(f"{label:<22} reads/s {len(latencies) / seconds:9.0f}   p50 {p[49] * 1000:6.2f} ms   "
+          f"p99 {p[98] * 1000:7.2f} ms   read errors {len(errors):5d}   write txns {stats['writes']:5d}")
+
+
+if __name__ == "__main__":
+    readers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    run("default (rollback)", False, readers, seconds)
+    run("tuned (WAL)", True, readers, seconds)
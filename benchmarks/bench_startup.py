@@ -0,0 +1,119 @@
+"""Worker startup time: importing the app, building it and serving the first request.
+
+Every run is a fresh interpreter, like a newly forked worker, against a
+migrated throwaway database. --revision measures an older commit the same way
+(it is extracted with `git archive`), so a change can be compared to what it
+replaced; revisions from before create_app() existed use their module-level app.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 20 --revision HEAD~1
+    python benchmarks/bench_startup.py --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# runs inside the measured interpreter, prints one JSON line
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app as module
+imported = time.perf_counter()
+app = module.create_app() if hasattr(module, "create_app") else module.app
+created = time.perf_counter()
+client = app.test_client()
+status = client.get("/").status_code
+first = time.perf_counter()
+client.get("/")
+second = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "create_ms": (created - imported) * 1000,
+    "first_request_ms": (first - created) * 1000,
+    "second_request_ms": (second - first) * 1000,
+    "status": status,
+    "modules": len(sys.modules),
+    "heavy_modules": sorted(m for m in ("alembic", "flask_dance", "flask_mail", "httpx", "numpy", "PIL.Image")
+                            if m in sys.modules),
+}))
+"""
+PHASES = ["import_ms", "create_ms", "first_request_ms", "second_request_ms", "process_ms"]
+
+
+def checkout(revision, directory):
+    """Extract revision of the repo into directory"""
+    archive = os.path.join(directory, "tree.tar")
+    with open(archive, "wb") as f:
+        subprocess.run(["git", "archive", revision], cwd=ROOT, stdout=f, check=True)
+    tree = os.path.join(directory, "tree")
+    with tarfile.open(archive) as tar:
+        tar.extractall(tree)
+    return tree
+
+
+def measure(tree, env, runs):
+    results = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", PROBE], cwd=tree, env=env,
+                             capture_output=True, text=True)
+        process_ms = (time.perf_counter() - started) * 1000
+        if out.returncode:
+            raise RuntimeError(f"probe failed in {tree}:\n{out.stderr}")
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        result["process_ms"] = process_ms
+        results.append(result)
+
+    summary = {phase: statistics.median(r[phase] for r in results) for phase in PHASES}
+    summary["min_process_ms"] = min(r["process_ms"] for r in results)
+    summary["status"] = results[-1]["status"]
+    summary["modules"] = results[-1]["modules"]
+    summary["heavy_modules"] = results[-1]["heavy_modules"]
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10, help="fresh interpreters per tree")
+    parser.add_argument("--revision", help="also measure this git revision, e.g. HEAD~1")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'startup.db')}",
+                   METRICS_ENABLED="0")
+        subprocess.run([sys.executable, "-m", "flask", "--app", "app", "db", "upgrade"],
+                       cwd=ROOT, env=env, check=True, capture_output=True)
+
+        trees = {"working tree": ROOT}
+        if args.revision:
+            trees[args.revision] = checkout(args.revision, tmp)
+        for name, tree in trees.items():
+            # one unmeasured run writes the .pyc files, so every run compares warm imports
+            measure(tree, env, 1)
+            results[name] = measure(tree, env, args.runs)
+
+    print(f"{'tree':<14} {'import':>8} {'create':>8} {'1st req':>8} {'2nd req':>8} {'process':>8} {'modules':>8}")
+    for name, r in results.items():
+        print(f"{name:<14} {r['import_ms']:8.1f} {r['create_ms']:8.1f} {r['first_request_ms']:8.1f} "
+              f"{r['second_request_ms']:8.1f} {r['process_ms']:8.1f} {r['modules']:8d}")
+        print(f"{'':<14} loaded: {', '.join(r['heavy_modules']) or 'none of the optional libraries'}")
+    print("median milliseconds per phase; process is the whole interpreter, start to exit")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"runs": args.runs, "python": sys.version.split()[0], "trees": results}, f, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Local stand-ins for the external services, so benchmarks never leave the machine.
+
+SpotifyStub answers the token and search endpoints SpotifyClient uses, after an
+optional delay. SMTPStub accepts and drops mail (needs aiosmtpd; without it
+the benchmark just keeps the mail queue from sending).
+"""
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:
+    Controller = None
+
+
+class SpotifyStub:
+    def __init__(self, latency=0.0):
+        stub = self
+        self.latency = latency
+        self.calls = {"token": 0, "search": 0}
+        self._lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def reply(self, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                stub.count("token")
+                self.reply({"access_token": "stub-token", "token_type": "Bearer", "expires_in": 3600})
+
+            def do_GET(self):
+                stub.count("search")
+                time.sleep(stub.latency)
+                self.reply({"tracks": {"items": [{"name": self.path, "id": "stub"}]}})
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def count(self, name):
+        with self._lock:
+            self.calls[name] += 1
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class SMTPStub:
+    def __init__(self):
+        self.received = 0
+        self.controller = None
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return "250 OK"
+
+    @property
+    def available(self):
+        return Controller is not None
+
+    def start(self):
+        if self.available:
+            self.controller = Controller(self, hostname="127.0.0.1", port=self.port)
+            self.controller.start()
+        return self
+
+    def stop(self):
+        if self.controller:
+            self.controller.stop()
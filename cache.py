@@ -0,0 +1,155 @@
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import current_app, make_response, request, session
+
+
+class TTLCache:
+    """Small thread-safe LRU cache whose entries also expire after ttl seconds"""
+
+    def __init__(self, maxsize=256, ttl=300, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires <= self.clock():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (self.clock() + (ttl or self.ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class LocalBackend:
+    """Per-process page store"""
+
+    def __init__(self, maxsize, ttl):
+        self.pages = TTLCache(maxsize, ttl)
+        self.generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self.pages.get(key)
+
+    def set(self, key, value, ttl):
+        self.pages.set(key, value, ttl)
+
+    def generation(self, tag):
+        return self.generations.get(tag, 0)
+
+    def bump(self, tag):
+        with self._lock:
+            self.generations[tag] = self.generations.get(tag, 0) + 1
+
+
+class RedisBackend:
+    """Page store shared by every app process, so an invalidation reaches all of them"""
+
+    def __init__(self, url, prefix="museum:"):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.setex(self.prefix + key, ttl, pickle.dumps(value))
+
+    def generation(self, tag):
+        return int(self.client.get(f"{self.prefix}gen:{tag}") or 0)
+
+    def bump(self, tag):
+        self.client.incr(f"{self.prefix}gen:{tag}")
+
+
+class PageCache:
+    """Caches rendered pages for anonymous visitors and answers conditional GETs.
+
+    Each cached view names the tags its output depends on, e.g. "feed" or
+    "card:{card_id}" (formatted with the view arguments). Every tag has a
+    generation number that is part of the cache key, so invalidate("feed")
+    makes all feed pages miss at once without having to find their keys.
+    Logged-in visitors and pages with pending flash messages are never cached.
+    Each app gets its own backend, in app.extensions["page_cache"].
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("PAGE_CACHE_SIZE", 512)
+        app.config.setdefault("PAGE_CACHE_TTL", 300)
+        app.config.setdefault("PAGE_CACHE_REDIS_URL", None)
+        if app.config["PAGE_CACHE_REDIS_URL"]:
+            app.extensions["page_cache"] = RedisBackend(app.config["PAGE_CACHE_REDIS_URL"])
+        else:
+            app.extensions["page_cache"] = LocalBackend(app.config["PAGE_CACHE_SIZE"], app.config["PAGE_CACHE_TTL"])
+
+    @property
+    def backend(self):
+        return current_app.extensions["page_cache"]
+
+    @staticmethod
+    def cacheable():
+        return request.method == "GET" and "user_id" not in session and "_flashes" not in session
+
+    def key(self, tags):
+        args = urlencode(sorted(request.args.items(multi=True)))
+        generations = ",".join(f"{tag}={self.backend.generation(tag)}" for tag in tags)
+        return f"page:{request.path}?{args}|{generations}"
+
+    def cached(self, *tags):
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                if not self.cacheable():
+                    return view(**kwargs)
+
+                key = self.key([tag.format(**kwargs) for tag in tags])
+                entry = self.backend.get(key)
+                if entry is None:
+                    response = make_response(view(**kwargs))
+                    if response.status_code != 200 or response.direct_passthrough:
+                        return response
+                    body = response.get_data()
+                    entry = (body, response.content_type, hashlib.sha1(body).hexdigest())
+                    self.backend.set(key, entry, current_app.config["PAGE_CACHE_TTL"])
+
+                body, content_type, etag = entry
+                response = make_response(body)
+                response.content_type = content_type
+                response.set_etag(etag)
+                response.headers["Cache-Control"] = "no-cache"
+                return response.make_conditional(request)
+            return wrapper
+        return decorator
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            self.backend.bump(tag)
@@ -0,0 +1,109 @@
+from sqlalchemy import bindparam, text
+
+# Card counts per (location, status) and per (user, status), kept up to date by
+# triggers on `card`. Every insert, delete or status/location/owner change
+# adjusts them inside the same transaction, whichever route (or bulk UPDATE,
+# or import) made it, so reading a count is a primary key lookup rather than
+# a scan of card. Rows that drop to zero are removed.
+STATS_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS card_stats_location (
+        location VARCHAR(100) NOT NULL,
+        status VARCHAR(20) NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (location, status)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS card_stats_user (
+        user_id INTEGER NOT NULL,
+        status VARCHAR(20) NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (user_id, status)
+    ) WITHOUT ROWID
+    """,
+]
+
+ADD_NEW = """
+    INSERT INTO card_stats_location (location, status, count) VALUES (new.location, new.status, 1)
+    ON CONFLICT (location, status) DO UPDATE SET count = count + 1;
+    INSERT INTO card_stats_user (user_id, status, count)
+    SELECT new.user_id, new.status, 1 WHERE new.user_id IS NOT NULL
+    ON CONFLICT (user_id, status) DO UPDATE SET count = count + 1;
+"""
+
+REMOVE_OLD = """
+    UPDATE card_stats_location SET count = count - 1 WHERE location = old.location AND status = old.status;
+    DELETE FROM card_stats_location WHERE location = old.location AND status = old.status AND count <= 0;
+    UPDATE card_stats_user SET count = count - 1 WHERE user_id = old.user_id AND status = old.status;
+    DELETE FROM card_stats_user WHERE user_id = old.user_id AND status = old.status AND count <= 0;
+"""
+
+STATS_TRIGGERS = [
+    f"CREATE TRIGGER IF NOT EXISTS card_stats_ai AFTER INSERT ON card BEGIN {ADD_NEW} END",
+    f"CREATE TRIGGER IF NOT EXISTS card_stats_ad AFTER DELETE ON card BEGIN {REMOVE_OLD} END",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS card_stats_au AFTER UPDATE OF location, status, user_id ON card
+    WHEN old.location IS NOT new.location OR old.status IS NOT new.status OR old.user_id IS NOT new.user_id
+    BEGIN {REMOVE_OLD} {ADD_NEW} END
+    """,
+]
+
+
+def create_card_stats(conn):
+    """Create the counter tables and triggers on an open connection, filling them if they are new"""
+    exists = conn.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'card_stats_location'"
+    )).first()
+    for table in STATS_TABLES:
+        conn.execute(text(table))
+    for trigger in STATS_TRIGGERS:
+        conn.execute(text(trigger))
+    if not exists:
+        rebuild_card_stats(conn)
+
+
+def _snapshot(conn):
+    rows = {("location", location, status): count for location, status, count in
+            conn.execute(text("SELECT location, status, count FROM card_stats_location"))}
+    rows.update({("user", user_id, status): count for user_id, status, count in
+                 conn.execute(text("SELECT user_id, status, count FROM card_stats_user"))})
+    return rows
+
+
+def rebuild_card_stats(conn):
+    """Recount everything from card. Returns how many counters were wrong."""
+    before = _snapshot(conn)
+    conn.execute(text("DELETE FROM card_stats_location"))
+    conn.execute(text("""
+        INSERT INTO card_stats_location (location, status, count)
+        SELECT location, status, COUNT(*) FROM card GROUP BY location, status
+    """))
+    conn.execute(text("DELETE FROM card_stats_user"))
+    conn.execute(text("""
+        INSERT INTO card_stats_user (user_id, status, count)
+        SELECT user_id, status, COUNT(*) FROM card WHERE user_id IS NOT NULL GROUP BY user_id, status
+    """))
+    after = _snapshot(conn)
+    return sum(1 for key in before.keys() | after.keys() if before.get(key) != after.get(key))
+
+
+def location_counts(conn):
+    """{location: {status: count}}"""
+    counts = {}
+    for location, status, count in conn.execute(text("SELECT location, status, count FROM card_stats_location")):
+        counts.setdefault(location, {})[status] = count
+    return counts
+
+
+def user_counts(conn, user_ids):
+    """{user_id: {status: count}} for the given users (users without cards are left out)"""
+    if not user_ids:
+        return {}
+    rows = conn.execute(text(
+        "SELECT user_id, status, count FROM card_stats_user WHERE user_id IN :user_ids"
+    ).bindparams(bindparam("user_ids", expanding=True)), {"user_ids": list(user_ids)})
+    counts = {}
+    for user_id, status, count in rows:
+        counts.setdefault(user_id, {})[status] = count
+    return counts
@@ -0,0 +1,111 @@
+import logging
+import sqlite3
+
+from flask import g, has_request_context, request
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+log = logging.getLogger(__name__)
+
+# Applied to every new SQLite connection. WAL lets readers carry on while a
+# write transaction is open, and NORMAL sync is safe under WAL (a power cut can
+# lose the last commits but never corrupts the file).
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,           # ms to wait for a lock instead of failing with "database is locked"
+    "cache_size": -64000,           # negative = KiB, so ~64 MB page cache per connection
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+    "foreign_keys": "ON",           # SQLite ignores FOREIGN KEY clauses (and ON DELETE CASCADE) without this
+}
+
+
+def apply_pragmas(dbapi_connection, pragmas):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def tune_engine(engine, pragmas=None, read_only=False):
+    """Run the pragmas on every connection the engine opens"""
+    pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+    if read_only:
+        pragmas["query_only"] = "ON"
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        apply_pragmas(dbapi_connection, pragmas)
+
+    return engine
+
+
+def init_db_config(app, db):
+    """Tune every SQLite engine of the app and, with SQLALCHEMY_READ_ONLY_ENGINE,
+    give the public read routes their own read-only connection pool."""
+    app.config.setdefault("SQLITE_PRAGMAS", DEFAULT_PRAGMAS)
+    app.config.setdefault("SQLALCHEMY_READ_ONLY_ENGINE", False)
+
+    with app.app_context():
+        write_engine = db.engine
+        for engine in db.engines.values():
+            if engine.dialect.name == "sqlite":
+                tune_engine(engine, app.config["SQLITE_PRAGMAS"])
+
+    read_engine = None
+    if app.config["SQLALCHEMY_READ_ONLY_ENGINE"] and write_engine.dialect.name == "sqlite":
+        read_engine = tune_engine(
+            create_engine(write_engine.url, **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {})),
+            app.config["SQLITE_PRAGMAS"],
+            read_only=True,
+        )
+    app.extensions["read_engine"] = read_engine
+
+    @app.teardown_appcontext
+    def close_read_session(exc):
+        read = g.pop("read_session", None)
+        if read is not None:
+            read.close()
+
+
+def read_session(app, db):
+    """Session for read-only routes: the read-only pool when configured, else db.session"""
+    read_engine = app.extensions.get("read_engine")
+    if read_engine is None:
+        return db.session
+    if "read_session" not in g:
+        g.read_session = Session(read_engine)
+    return g.read_session
+
+
+class TooManyQueries(AssertionError):
+    pass
+
+
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get("query_count", 0) + 1
+
+
+def init_query_counter(app):
+    """Count the SQL statements each request runs, on every engine. Past
+    MAX_QUERIES_PER_REQUEST the request is logged, or raises TooManyQueries when
+    app.testing is set, so an N+1 query pattern fails the test that hits it."""
+    app.config.setdefault("MAX_QUERIES_PER_REQUEST", None)
+    if not event.contains(Engine, "before_cursor_execute", count_query):
+        event.listen(Engine, "before_cursor_execute", count_query)
+
+    @app.after_request
+    def check_query_count(response):
+        limit = app.config["MAX_QUERIES_PER_REQUEST"]
+        count = g.get("query_count", 0)
+        if limit is not None and count > limit:
+            message = f"{request.method} {request.path} ran {count} queries (limit {limit})"
+            if app.testing:
+                raise TooManyQueries(message)
+            log.warning(message)
+        return response
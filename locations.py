@@ -1,3 +1,24 @@
+import heapq
+import statistics
+from functools import lru_cache
+
+
+def _numpy():
+    """numpy only speeds up batch lookups, so it is imported on the first one (None without it)"""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+DEFAULT_LOCATION = "MMU Campus"
+# regions covering more grid cells than this are tested on every lookup instead of bucketed
+MAX_CELLS_PER_REGION = 4096
+# decimal places the memoised lookup rounds to, ~1 m; region edges are ~30 m apart
+LOOKUP_PRECISION = 5
+
+# name: ((lat_min, lng_min), (lat_max, lng_max))
 map_locations = {
     "FCI": ((2.92690, 101.64050), (2.92720, 101.64120)),
     "FOM": ((2.92670, 101.64180), (2.92710, 101.64250)),
@@ -14,8 +35,167 @@ map_locations = {
     "DTC": ((2.92730, 101.64280), (2.92760, 101.64310)),
 }
 
+# name: [(lat, lng), ...] for places that are not a simple box
+map_polygons = {}
+
+
+class Region:
+    """A named box or polygon, in (lat, lng) degrees"""
+
+    def __init__(self, name, points):
+        self.name = name
+        if len(points) == 2:
+            (lat_min, lng_min), (lat_max, lng_max) = points
+            self.polygon = None
+            self.area = (lat_max - lat_min) * (lng_max - lng_min)
+        else:
+            self.polygon = [tuple(p) for p in points]
+            lats = [p[0] for p in self.polygon]
+            lngs = [p[1] for p in self.polygon]
+            lat_min, lat_max, lng_min, lng_max = min(lats), max(lats), min(lngs), max(lngs)
+            self.area = abs(sum(
+                a[0] * b[1] - b[0] * a[1]
+                for a, b in zip(self.polygon, self.polygon[1:] + self.polygon[:1])
+            )) / 2
+        self.bounds = (lat_min, lng_min, lat_max, lng_max)
+
+    def contains(self, lat, lng):
+        lat_min, lng_min, lat_max, lng_max = self.bounds
+        if not (lat_min <= lat <= lat_max and lng_min <= lng <= lng_max):
+            return False
+        if self.polygon is None:
+            return True
+        # ray casting along the lng axis
+        inside = False
+        j = len(self.polygon) - 1
+        for i in range(len(self.polygon)):
+            lat_i, lng_i = self.polygon[i]
+            lat_j, lng_j = self.polygon[j]
+            if (lng_i > lng) != (lng_j > lng):
+                if lat < (lat_j - lat_i) * (lng - lng_i) / (lng_j - lng_i) + lat_i:
+                    inside = not inside
+            j = i
+        return inside
+
+    def contains_many(self, lat, lng):
+        """Vectorised contains() over numpy arrays"""
+        np = _numpy()
+        lat_min, lng_min, lat_max, lng_max = self.bounds
+        mask = (lat >= lat_min) & (lat <= lat_max) & (lng >= lng_min) & (lng <= lng_max)
+        if self.polygon is None:
+            return mask
+        inside = np.zeros(len(lat), dtype=bool)
+        j = len(self.polygon) - 1
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for i in range(len(self.polygon)):
+                lat_i, lng_i = self.polygon[i]
+                lat_j, lng_j = self.polygon[j]
+                crosses = ((lng_i > lng) != (lng_j > lng)) & (
+                    lat < (lat_j - lat_i) * (lng - lng_i) / (lng_j - lng_i) + lat_i
+                )
+                inside ^= crosses
+                j = i
+        return mask & inside
+
+
+class RegionIndex:
+    """Point-in-region lookup over a fixed set of regions.
+
+    Regions are bucketed into a uniform grid over their combined extent, so a
+    lookup only tests the handful of regions sharing the point's cell instead
+    of every region. The cell size defaults to the median region extent, so
+    a typical region spans a few cells whatever the map's scale; regions
+    spanning more than max_cells cells (one huge polygon among campus
+    buildings) are kept out of the grid and tested on every lookup. When
+    regions overlap the smallest one wins (Gym inside Stadium is reported as
+    Gym); equal areas go to the one declared first.
+    """
+
+    def __init__(self, regions, cell_size=None, max_cells=MAX_CELLS_PER_REGION, default=DEFAULT_LOCATION):
+        # priority order: smallest first, then declaration order (sorted() is stable)
+        self.regions = sorted(regions, key=lambda r: r.area)
+        self.priority = {region: i for i, region in enumerate(self.regions)}
+        self.default = default
+        self.cell_size = cell_size or self.median_extent(self.regions)
+        self.cells = {}
+        self.large = []
+        if not self.regions:
+            self.origin = (0.0, 0.0)
+            return
+
+        self.origin = (min(r.bounds[0] for r in self.regions), min(r.bounds[1] for r in self.regions))
+        for region in self.regions:
+            lat_min, lng_min, lat_max, lng_max = region.bounds
+            row_min, col_min = self.cell(lat_min, lng_min)
+            row_max, col_max = self.cell(lat_max, lng_max)
+            if (row_max - row_min + 1) * (col_max - col_min + 1) > max_cells:
+                self.large.append(region)
+                continue
+            for row in range(row_min, row_max + 1):
+                for col in range(col_min, col_max + 1):
+                    self.cells.setdefault((row, col), []).append(region)
+
+    @staticmethod
+    def median_extent(regions, fallback=0.0001):
+        """Median of the regions' larger side, in degrees (fallback when there are none or all are points)"""
+        extents = [max(r.bounds[2] - r.bounds[0], r.bounds[3] - r.bounds[1]) for r in regions]
+        extents = [e for e in extents if e > 0]
+        return statistics.median(extents) if extents else fallback
+
+    @classmethod
+    def from_locations(cls, boxes, polygons=None, **kwargs):
+        regions = [Region(name, points) for name, points in boxes.items()]
+        regions += [Region(name, points) for name, points in (polygons or {}).items()]
+        return cls(regions, **kwargs)
+
+    def cell(self, lat, lng):
+        return (int((lat - self.origin[0]) // self.cell_size),
+                int((lng - self.origin[1]) // self.cell_size))
+
+    def lookup(self, lat, lng):
+        candidates = self.cells.get(self.cell(lat, lng), ())
+        if self.large:
+            # both lists are in priority order already
+            candidates = heapq.merge(candidates, self.large, key=self.priority.__getitem__)
+        for region in candidates:
+            if region.contains(lat, lng):
+                return region.name
+        return self.default
+
+    def lookup_many(self, coords):
+        """Names for an (n, 2) array of (lat, lng) rows"""
+        np = _numpy()
+        if np is None:
+            return [self.lookup(lat, lng) for lat, lng in coords]
+
+        coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        lat, lng = coords[:, 0], coords[:, 1]
+        # -1 picks the trailing default name below
+        winner = np.full(len(coords), -1)
+        # paint lowest priority first so higher priority regions overwrite it
+        for i in range(len(self.regions) - 1, -1, -1):
+            winner[self.regions[i].contains_many(lat, lng)] = i
+        names = np.array([r.name for r in self.regions] + [self.default], dtype=object)
+        return names[winner].tolist()
+
+
+region_index = RegionIndex.from_locations(map_locations, map_polygons)
+
+
 def get_faculty_name(lat, lng):
-    for name, ((lat_min, lng_min), (lat_max, lng_max)) in map_locations.items():
-        if lat_min <= lat <= lat_max and lng_min <= lng <= lng_max:
-            return name
-    return "MMU Campus"
\ No newline at end of file
+    return region_index.lookup(lat, lng)
+
+
+def get_faculty_names(coords):
+    """Batch get_faculty_name for a sequence or numpy array of (lat, lng) pairs"""
+    return region_index.lookup_many(coords)
+
+
+@lru_cache(maxsize=4096)
+def _cell_name(lat, lng):
+    return region_index.lookup(lat, lng)
+
+
+def get_faculty_name_cached(lat, lng):
+    """get_faculty_name on a ~1 m grid, memoised, for the per-click map lookups"""
+    return _cell_name(round(lat, LOOKUP_PRECISION), round(lng, LOOKUP_PRECISION))
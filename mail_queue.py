@@ -0,0 +1,180 @@
+import json
+import logging
+import smtplib
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+log = logging.getLogger(__name__)
+
+
+class SenderState:
+    """One app's background sender: its thread, Flask-Mail instance and send pacing"""
+
+    def __init__(self):
+        self.thread = None
+        self.mail = None
+        self.wake = threading.Event()
+        self.lock = threading.Lock()
+        self.last_send = 0.0
+
+
+class MailQueue:
+    """Persistent outbound mail queue drained by a background sender thread.
+
+    Routes call enqueue(), which only writes a row to the outbox table. The
+    sender thread picks up due messages, sends them over a single SMTP
+    connection per batch, spaces sends out to MAIL_RATE_PER_MINUTE and
+    reschedules failures with exponential backoff until MAIL_MAX_ATTEMPTS.
+    Messages are leased (next_attempt_at pushed into the future) before
+    sending, so several app processes can share one outbox safely.
+    Each app gets its own sender, in app.extensions["mail_queue"].
+    """
+
+    def __init__(self, app=None, db=None, model=None):
+        self.db = db
+        self.model = model
+        if app is not None:
+            self.init_app(app, db, model)
+
+    def init_app(self, app, db, model):
+        self.db = db
+        self.model = model
+        app.extensions["mail_queue"] = SenderState()
+        app.config.setdefault("MAIL_RATE_PER_MINUTE", 30)
+        app.config.setdefault("MAIL_MAX_ATTEMPTS", 8)
+        app.config.setdefault("MAIL_RETRY_BASE_SECONDS", 30)
+        app.config.setdefault("MAIL_RETRY_MAX_SECONDS", 3600)
+        app.config.setdefault("MAIL_QUEUE_POLL_SECONDS", 30)
+        app.config.setdefault("MAIL_QUEUE_LEASE_SECONDS", 300)
+        # set False to drain only from `flask drain-mail` (e.g. a separate worker)
+        app.config.setdefault("MAIL_QUEUE_BACKGROUND", True)
+
+        @app.before_request
+        def start_mail_sender():
+            self.start()
+
+    @staticmethod
+    def state():
+        return current_app.extensions["mail_queue"]
+
+    @property
+    def mail(self):
+        """Flask-Mail, loaded when the first batch is sent rather than at startup"""
+        state = self.state()
+        if state.mail is None:
+            from flask_mail import Mail
+            state.mail = Mail(current_app)
+        return state.mail
+
+    def enqueue(self, subject, recipients, body, sender=None):
+        message = self.model(
+            subject=subject,
+            sender=sender or current_app.config.get("MAIL_DEFAULT_SENDER") or current_app.config.get("MAIL_USERNAME"),
+            recipients=json.dumps(list(recipients)),
+            body=body,
+        )
+        self.db.session.add(message)
+        self.db.session.commit()
+        self.state().wake.set()
+        return message
+
+    def start(self):
+        state = self.state()
+        if state.thread is not None or not current_app.config["MAIL_QUEUE_BACKGROUND"]:
+            return
+        with state.lock:
+            if state.thread is None:
+                app = current_app._get_current_object()
+                state.thread = threading.Thread(target=self._run, args=(app, state), name="mail-queue", daemon=True)
+                state.thread.start()
+
+    def _run(self, app, state):
+        while True:
+            with app.app_context():
+                try:
+                    while self.drain_once():
+                        pass
+                except Exception:
+                    log.exception("mail queue drain failed")
+            state.wake.wait(app.config["MAIL_QUEUE_POLL_SECONDS"])
+            state.wake.clear()
+
+    def backoff(self, attempts):
+        config = current_app.config
+        return timedelta(seconds=min(config["MAIL_RETRY_BASE_SECONDS"] * 2 ** (attempts - 1),
+                                     config["MAIL_RETRY_MAX_SECONDS"]))
+
+    def _claim(self, limit):
+        Outbox = self.model
+        now = datetime.utcnow()
+        lease_until = now + timedelta(seconds=current_app.config["MAIL_QUEUE_LEASE_SECONDS"])
+        due = (Outbox.query
+               .filter(Outbox.status == "pending", Outbox.next_attempt_at <= now)
+               .order_by(Outbox.next_attempt_at)
+               .limit(limit)
+               .all())
+        claimed = []
+        for message in due:
+            taken = (Outbox.query
+                     .filter_by(id=message.id, next_attempt_at=message.next_attempt_at)
+                     .update({"next_attempt_at": lease_until}))
+            if taken:
+                claimed.append(message)
+        self.db.session.commit()
+        return claimed
+
+    def _throttle(self):
+        state = self.state()
+        interval = 60.0 / current_app.config["MAIL_RATE_PER_MINUTE"]
+        wait = state.last_send + interval - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        state.last_send = time.monotonic()
+
+    def _failed(self, message, error):
+        message.attempts += 1
+        message.last_error = str(error)[:500]
+        if message.attempts >= current_app.config["MAIL_MAX_ATTEMPTS"]:
+            message.status = "failed"
+            log.error("giving up on mail %s to %s: %s", message.id, message.recipients, error)
+        else:
+            message.next_attempt_at = datetime.utcnow() + self.backoff(message.attempts)
+
+    def drain_once(self, limit=50):
+        """Send one batch of due messages. Returns how many were sent."""
+        claimed = self._claim(limit)
+        if not claimed:
+            return 0
+
+        from flask_mail import Message
+
+        sent = 0
+        pending = list(claimed)
+        try:
+            with self.mail.connect() as conn:
+                while pending:
+                    message = pending[0]
+                    self._throttle()
+                    try:
+                        conn.send(Message(message.subject, sender=message.sender,
+                                          recipients=json.loads(message.recipients), body=message.body))
+                    except smtplib.SMTPServerDisconnected:
+                        raise  # connection is gone, handled below for the whole batch
+                    except smtplib.SMTPException as e:
+                        # this message was refused (bad recipient etc.), the connection is fine
+                        self._failed(message, e)
+                    else:
+                        message.status = "sent"
+                        message.sent_at = datetime.utcnow()
+                        sent += 1
+                    pending.pop(0)
+                    self.db.session.commit()
+        except OSError as e:  # includes SMTPException raised while connecting
+            log.warning("SMTP connection failed, %d messages rescheduled: %s", len(pending), e)
+            for message in pending:
+                self._failed(message, e)
+            self.db.session.commit()
+        return sent
@@ -0,0 +1,145 @@
+import io
+import json
+import logging
+import os
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from flask import current_app
+
+from PIL import Image, ImageOps, features
+
+import storage
+
+log = logging.getLogger(__name__)
+
+# srcset widths generated for every photo, in pixels
+VARIANT_WIDTHS = (320, 640, 1280)
+THUMB_SIZE = (200, 200)
+POSTER_WIDTH = 640
+# Image.info keys that can identify the photographer or where a photo was taken
+METADATA_KEYS = ("exif", "xmp", "XML:com.adobe.xmp", "comment")
+
+
+def modern_formats():
+    """Image formats this Pillow build can write, best compression first"""
+    formats = []
+    if features.check("avif"):
+        formats.append("avif")
+    if features.check("webp"):
+        formats.append("webp")
+    return formats
+
+
+def variant_paths(variants):
+    """Every file path recorded in a Photo.variants JSON string"""
+    data = json.loads(variants or "{}")
+    paths = [path for sizes in data.get("srcset", {}).values() for path in sizes.values()]
+    if data.get("thumb"):
+        paths.append(data["thumb"])
+    return paths
+
+
+def has_metadata(image):
+    """Whether an opened image carries EXIF, XMP or comments worth stripping"""
+    return bool(image.getexif()) or any(key in image.info for key in METADATA_KEYS)
+
+
+def process_photo(static_folder, file_path):
+    """Strip metadata from an uploaded photo and write its thumbnail and srcset variants.
+
+    file_path is relative to the static folder (e.g. "uploads/ab/cd/abcd....jpg").
+    Blobs are named by their content and never rewritten, so a photo carrying
+    metadata (location data in phone photos) is saved again without it as a
+    blob of its own. Returns (path of that clean photo, variants dict to store
+    on Photo), or None if the photo can't be processed.
+    """
+    with Image.open(os.path.join(static_folder, file_path)) as original:
+        # animated GIFs would lose every frame but the first
+        if getattr(original, "is_animated", False):
+            return None
+        fmt = original.format
+        strip = has_metadata(original)
+        image = ImageOps.exif_transpose(original)
+        image.load()
+
+    if strip:
+        clean = io.BytesIO()
+        image.save(clean, format=fmt, quality=90)
+        clean.seek(0)
+        file_path = storage.store_stream(clean, static_folder, os.path.splitext(file_path)[1])
+    base = os.path.splitext(file_path)[0]
+
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+    variants = {"width": image.width, "height": image.height, "srcset": {}}
+    for fmt in modern_formats():
+        sizes = {}
+        for width in VARIANT_WIDTHS:
+            if width >= image.width and sizes:
+                break
+            resized = image.copy()
+            resized.thumbnail((width, width * 10))
+            path = f"{base}_w{resized.width}.{fmt}"
+            storage.save_derived(static_folder, path, partial(resized.save, format=fmt.upper(), quality=70))
+            sizes[resized.width] = path
+        variants["srcset"][fmt] = sizes
+
+    thumb = ImageOps.fit(image, THUMB_SIZE).convert("RGB")
+    thumb_fmt = (modern_formats() or ["jpeg"])[-1]
+    variants["thumb"] = f"{base}_thumb.{thumb_fmt}"
+    storage.save_derived(static_folder, variants["thumb"], partial(thumb.save, format=thumb_fmt.upper()))
+    return file_path, variants
+
+
+def extract_poster(static_folder, video_path):
+    """Grab a frame one second into the video as its poster image, if ffmpeg is available"""
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        return None
+    poster = f"{os.path.splitext(video_path)[0]}_poster.jpg"
+    result = subprocess.run(
+        [ffmpeg, "-y", "-loglevel", "error", "-ss", "1", "-i", os.path.join(static_folder, video_path),
+         "-frames:v", "1", "-vf", f"scale='min({POSTER_WIDTH},iw)':-2", os.path.join(static_folder, poster)],
+        capture_output=True, timeout=60,
+    )
+    if result.returncode != 0:
+        log.warning("poster extraction failed for %s: %s", video_path, result.stderr.decode(errors="replace"))
+        return None
+    return poster
+
+
+class MediaProcessor:
+    """Runs photo and video post-processing on a background thread pool.
+
+    Jobs run after the upload request has returned and write their results
+    back to the database inside their own app context. With workers=0 jobs
+    run inline, which is handy in tests and scripts. Each app gets its own
+    pool, in app.extensions["media"].
+    """
+
+    def __init__(self, app=None, workers=2):
+        if app is not None:
+            self.init_app(app, workers)
+
+    def init_app(self, app, workers=2):
+        workers = app.config.get("MEDIA_WORKERS", workers)
+        app.extensions["media"] = ThreadPoolExecutor(workers, thread_name_prefix="media") if workers else None
+
+    def submit(self, fn, *args):
+        app = current_app._get_current_object()
+        executor = app.extensions["media"]
+        if executor is None:
+            return self._run(app, fn, *args)
+        return executor.submit(self._run, app, fn, *args)
+
+    @staticmethod
+    def _run(app, fn, *args):
+        with app.app_context():
+            try:
+                fn(*args)
+            except Exception:
+                log.exception("media job %s%r failed", fn.__name__, args)
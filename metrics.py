@@ -0,0 +1,237 @@
+import cProfile
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+
+from flask import (Response, abort, before_render_template, current_app, g, has_request_context, request,
+                   template_rendered)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+try:
+    from pyinstrument import Profiler as Pyinstrument
+except ImportError:
+    Pyinstrument = None
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PARTS = ("sql", "template", "external")
+
+
+def _timings():
+    return g.get("metrics_timings") if has_request_context() else None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _timings() is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = _timings()
+    started = getattr(context, "_metrics_started", None)
+    if timings is not None and started is not None:
+        timings["sql"] += time.perf_counter() - started
+
+
+def _before_render(app, template, context, **extra):
+    if _timings() is not None:
+        g.metrics_template_started = time.perf_counter()
+
+
+def _after_render(app, template, context, **extra):
+    timings = _timings()
+    started = g.pop("metrics_template_started", None) if timings is not None else None
+    if started is not None:
+        timings["template"] += time.perf_counter() - started
+
+
+class Counters:
+    """One app's totals since the process started"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = defaultdict(int)            # (endpoint, method, status) -> count
+        self.buckets = defaultdict(lambda: [0] * len(BUCKETS))
+        self.duration = defaultdict(float)          # endpoint -> seconds
+        self.parts = defaultdict(float)             # (endpoint, part) -> seconds
+        self.queries = defaultdict(int)             # endpoint -> statements
+        self.external = defaultdict(lambda: [0, 0.0, 0])  # upstream -> [calls, seconds, errors]
+
+
+class Metrics:
+    """Opt-in per-request timing, split into SQL, template rendering and
+    outbound HTTP, exposed in the Prometheus text format at /metrics.
+
+    Counters live in the process, so with several workers each one reports its
+    own. With PROFILE_SAMPLE_RATE set, that fraction of requests runs under
+    cProfile (or pyinstrument, PROFILER = "pyinstrument") and the ones slower
+    than PROFILE_SLOW_SECONDS are dumped into PROFILE_DIR. Each app keeps its
+    own Counters, in app.extensions["metrics"].
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("METRICS_ENABLED", False)
+        app.config.setdefault("METRICS_TOKEN", None)
+        app.config.setdefault("PROFILE_SAMPLE_RATE", 0.0)
+        app.config.setdefault("PROFILE_SLOW_SECONDS", 0.5)
+        app.config.setdefault("PROFILE_DIR", os.path.join(app.instance_path, "profiles"))
+        app.config.setdefault("PROFILER", "cprofile")
+        app.extensions["metrics"] = Counters()
+        if not app.config["METRICS_ENABLED"]:
+            return
+
+        if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        before_render_template.connect(_before_render, app)
+        template_rendered.connect(_after_render, app)
+
+        # first, so the clock covers the other before_request hooks too
+        app.before_request_funcs.setdefault(None, []).insert(0, self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._stop_profiler)
+        app.add_url_rule("/metrics", "metrics", self.render)
+
+    def instrument_session(self, session, upstream):
+        """Time every call a requests.Session makes, as external time of the current request"""
+        if not current_app.config["METRICS_ENABLED"]:
+            return session
+        counters = current_app.extensions["metrics"]
+        send = session.send
+
+        def timed_send(*args, **kwargs):
+            started = time.perf_counter()
+            failed = True
+            try:
+                response = send(*args, **kwargs)
+                failed = response.status_code >= 500
+                return response
+            finally:
+                elapsed = time.perf_counter() - started
+                timings = _timings()
+                if timings is not None:
+                    timings["external"] += elapsed
+                with counters.lock:
+                    stats = counters.external[upstream]
+                    stats[0] += 1
+                    stats[1] += elapsed
+                    stats[2] += failed
+
+        session.send = timed_send
+        return session
+
+    def _start(self):
+        g.metrics_timings = dict.fromkeys(PARTS, 0.0)
+        g.metrics_started = time.perf_counter()
+        rate = current_app.config["PROFILE_SAMPLE_RATE"]
+        if rate and request.endpoint != "metrics" and random.random() < rate:
+            g.metrics_profiler = self._start_profiler()
+
+    def _start_profiler(self):
+        try:
+            if current_app.config["PROFILER"] == "pyinstrument" and Pyinstrument is not None:
+                profiler = Pyinstrument()
+                profiler.start()
+            else:
+                profiler = cProfile.Profile()
+                profiler.enable()
+        except (RuntimeError, ValueError):
+            return None  # another profiler is already running in this thread
+        return profiler
+
+    def _finish(self, response):
+        started = g.pop("metrics_started", None)
+        if started is None or request.endpoint == "metrics":
+            return response
+        elapsed = g.metrics_elapsed = time.perf_counter() - started
+        endpoint = request.endpoint or "unmatched"
+        timings = g.metrics_timings
+        counters = current_app.extensions["metrics"]
+
+        with counters.lock:
+            counters.requests[(endpoint, request.method, response.status_code)] += 1
+            counters.duration[endpoint] += elapsed
+            counts = counters.buckets[endpoint]
+            for i, bound in enumerate(BUCKETS):
+                if elapsed <= bound:
+                    counts[i] += 1
+            for part in PARTS:
+                counters.parts[(endpoint, part)] += timings[part]
+            counters.queries[endpoint] += g.get("query_count", 0)
+        return response
+
+    def _stop_profiler(self, exc):
+        # teardown always runs, so a sampled request never leaves its profiler on
+        profiler = g.pop("metrics_profiler", None)
+        if profiler is None:
+            return
+        is_cprofile = isinstance(profiler, cProfile.Profile)
+        if is_cprofile:
+            profiler.disable()
+        else:
+            profiler.stop()
+        elapsed = g.get("metrics_elapsed")
+        if elapsed is None or elapsed < current_app.config["PROFILE_SLOW_SECONDS"]:
+            return
+        endpoint = request.endpoint or "unmatched"
+        directory = current_app.config["PROFILE_DIR"]
+        os.makedirs(directory, exist_ok=True)
+        name = f"{endpoint}-{time.strftime('%Y%m%d-%H%M%S')}-{int(elapsed * 1000)}ms"
+        if is_cprofile:
+            profiler.dump_stats(os.path.join(directory, name + ".prof"))
+        else:
+            with open(os.path.join(directory, name + ".html"), "w") as f:
+                f.write(profiler.output_html())
+
+    def render(self):
+        token = current_app.config["METRICS_TOKEN"]
+        counters = current_app.extensions["metrics"]
+        if token and request.headers.get("Authorization") != f"Bearer {token}":
+            abort(403)
+
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}")
+
+        with counters.lock:
+            metric("http_requests_total", "counter", "Requests handled, by endpoint, method and status.",
+                   [({"endpoint": e, "method": m, "status": s}, n) for (e, m, s), n in sorted(counters.requests.items())])
+
+            histogram = []
+            for endpoint, counts in sorted(counters.buckets.items()):
+                total = sum(n for (e, _, _), n in counters.requests.items() if e == endpoint)
+                for bound, n in zip(BUCKETS, counts):
+                    histogram.append(("_bucket", {"endpoint": endpoint, "le": bound}, n))
+                histogram.append(("_bucket", {"endpoint": endpoint, "le": "+Inf"}, total))
+                histogram.append(("_sum", {"endpoint": endpoint}, round(counters.duration[endpoint], 6)))
+                histogram.append(("_count", {"endpoint": endpoint}, total))
+            lines.append("# HELP http_request_duration_seconds Time spent handling requests.")
+            lines.append("# TYPE http_request_duration_seconds histogram")
+            for suffix, labels, value in histogram:
+                label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+                lines.append(f"http_request_duration_seconds{suffix}{{{label_text}}} {value}")
+
+            metric("http_request_part_seconds_total", "counter",
+                   "Time spent in SQL, template rendering and outbound HTTP, by endpoint.",
+                   [({"endpoint": e, "part": p}, round(v, 6)) for (e, p), v in sorted(counters.parts.items())])
+            metric("http_request_sql_queries_total", "counter", "SQL statements run, by endpoint.",
+                   [({"endpoint": e}, n) for e, n in sorted(counters.queries.items())])
+            metric("external_requests_total", "counter", "Outbound HTTP calls, by upstream.",
+                   [({"upstream": u}, s[0]) for u, s in sorted(counters.external.items())])
+            metric("external_request_seconds_total", "counter", "Time spent in outbound HTTP calls, by upstream.",
+                   [({"upstream": u}, round(s[1], 6)) for u, s in sorted(counters.external.items())])
+            metric("external_request_errors_total", "counter", "Outbound HTTP calls that failed, by upstream.",
+                   [({"upstream": u}, s[2]) for u, s in sorted(counters.external.items())])
+
+        return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,29 @@
+"""card counters per location and per user, kept by triggers
+
+Revision ID: 168f4349e2da
+Revises: 8b41e07d5a2c
+Create Date: 2026-10-18 16:02:44.190312
+
+"""
+from alembic import op
+
+from card_stats import create_card_stats
+
+
+# revision identifiers, used by Alembic.
+revision = '168f4349e2da'
+down_revision = '8b41e07d5a2c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # creates card_stats_location, card_stats_user and their triggers, counting the existing cards
+    create_card_stats(op.get_bind())
+
+
+def downgrade():
+    for trigger in ('card_stats_ai', 'card_stats_ad', 'card_stats_au'):
+        op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    op.execute('DROP TABLE IF EXISTS card_stats_user')
+    op.execute('DROP TABLE IF EXISTS card_stats_location')
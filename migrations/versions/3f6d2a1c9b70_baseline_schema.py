@@ -0,0 +1,68 @@
+"""baseline schema
+
+Revision ID: 3f6d2a1c9b70
+Revises:
+Create Date: 2026-10-18 10:12:41.503118
+
+The user, card and photo tables as they were before migrations existed.
+Databases created back then already have them, so each table is only
+created when missing and `flask db upgrade` works on old and new databases.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f6d2a1c9b70'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'user' not in existing:
+        op.create_table(
+            'user',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('username', sa.String(length=150), nullable=True),
+            sa.Column('email', sa.String(length=150), nullable=False),
+            sa.Column('password', sa.String(length=200), nullable=True),
+            sa.Column('is_admin', sa.Boolean(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('username'),
+            sa.UniqueConstraint('email'),
+        )
+    if 'card' not in existing:
+        op.create_table(
+            'card',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('to_name', sa.String(length=50), nullable=False),
+            sa.Column('location', sa.String(length=100), nullable=False),
+            sa.Column('message', sa.Text(), nullable=False),
+            sa.Column('video', sa.String(length=200), nullable=True),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('song', sa.Text(), nullable=True),
+            sa.Column('created', sa.DateTime(), nullable=True),
+            sa.Column('lat', sa.Float(), nullable=True),
+            sa.Column('lng', sa.Float(), nullable=True),
+            sa.Column('status', sa.String(length=20), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    if 'photo' not in existing:
+        op.create_table(
+            'photo',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('card_id', sa.Integer(), nullable=False),
+            sa.Column('file_path', sa.String(length=200), nullable=False),
+            sa.ForeignKeyConstraint(['card_id'], ['card.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+
+
+def downgrade():
+    op.drop_table('photo')
+    op.drop_table('card')
+    op.drop_table('user')
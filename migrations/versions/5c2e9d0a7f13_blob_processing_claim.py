@@ -0,0 +1,26 @@
+"""blob.processing, so only one media job processes a shared blob
+
+Revision ID: 5c2e9d0a7f13
+Revises: 168f4349e2da
+Create Date: 2026-10-18 19:12:35.604118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c2e9d0a7f13'
+down_revision = '168f4349e2da'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('blob', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('processing', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('blob', schema=None) as batch_op:
+        batch_op.drop_column('processing')
@@ -0,0 +1,106 @@
+"""from_name, hot path indexes, cascades and the tables added since the baseline
+
+Revision ID: 8b41e07d5a2c
+Revises: 3f6d2a1c9b70
+Create Date: 2026-10-18 10:31:07.228915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from search_index import create_search_index
+from spatial_index import create_spatial_index
+
+
+# revision identifiers, used by Alembic.
+revision = '8b41e07d5a2c'
+down_revision = '3f6d2a1c9b70'
+branch_labels = None
+depends_on = None
+
+
+def photo_table(ondelete):
+    # SQLite can't alter a foreign key, so batch mode rebuilds photo from this definition
+    return sa.Table(
+        'photo', sa.MetaData(),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('card_id', sa.Integer(), nullable=False),
+        sa.Column('file_path', sa.String(length=200), nullable=False),
+        sa.ForeignKeyConstraint(['card_id'], ['card.id'], ondelete=ondelete),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def upgrade():
+    op.add_column('card', sa.Column('from_name', sa.String(length=50), nullable=True))
+    op.add_column('card', sa.Column('video_poster', sa.String(length=200), nullable=True))
+    # feed and admin lists: WHERE status = ? ORDER BY created DESC
+    op.create_index('ix_card_status_created', 'card', ['status', 'created'])
+    op.create_index('ix_card_created', 'card', ['created'])
+    op.create_index('ix_card_user_id', 'card', ['user_id'])
+
+    with op.batch_alter_table('photo', recreate='always', copy_from=photo_table('CASCADE')) as batch_op:
+        batch_op.add_column(sa.Column('variants', sa.Text(), nullable=True))
+        batch_op.create_index('ix_photo_card_id', ['card_id'])
+
+    op.create_table(
+        'blob',
+        sa.Column('path', sa.String(length=200), nullable=False),
+        sa.Column('refcount', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('path'),
+    )
+    op.create_table(
+        'video_upload',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('card_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('filename', sa.String(length=200), nullable=False),
+        sa.Column('length', sa.BigInteger(), nullable=False),
+        sa.Column('offset', sa.BigInteger(), nullable=False),
+        sa.Column('created', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['card_id'], ['card.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'outbox_message',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('subject', sa.String(length=200), nullable=False),
+        sa.Column('sender', sa.String(length=150), nullable=True),
+        sa.Column('recipients', sa.Text(), nullable=False),
+        sa.Column('body', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created', sa.DateTime(), nullable=True),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_outbox_message_status_next_attempt', 'outbox_message', ['status', 'next_attempt_at'])
+
+    create_search_index(op.get_bind())
+    create_spatial_index(op.get_bind())
+
+
+def downgrade():
+    for trigger in ('card_fts_ai', 'card_fts_ad', 'card_fts_au', 'card_rtree_ai', 'card_rtree_ad', 'card_rtree_au'):
+        op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    op.execute('DROP TABLE IF EXISTS card_fts')
+    op.execute('DROP TABLE IF EXISTS card_rtree')
+
+    op.drop_index('ix_outbox_message_status_next_attempt', table_name='outbox_message')
+    op.drop_table('outbox_message')
+    op.drop_table('video_upload')
+    op.drop_table('blob')
+
+    # the rebuild keeps only the columns of the baseline definition, dropping variants and the index
+    with op.batch_alter_table('photo', recreate='always', copy_from=photo_table(None)):
+        pass
+
+    op.drop_index('ix_card_user_id', table_name='card')
+    op.drop_index('ix_card_created', table_name='card')
+    op.drop_index('ix_card_status_created', table_name='card')
+    # native DROP COLUMN: a batch rebuild of card would cascade-delete every photo
+    op.execute('ALTER TABLE card DROP COLUMN video_poster')
+    op.execute('ALTER TABLE card DROP COLUMN from_name')
@@ -0,0 +1,136 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, jsonify, request, session
+
+
+class MemoryStore:
+    """Per-process buckets. Only the most recently used maxsize clients are kept;
+    a forgotten client simply starts again with a full bucket."""
+
+    blocking = False
+
+    def __init__(self, maxsize=10000, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        """Take one token. Returns (allowed, seconds until the next token)."""
+        with self._lock:
+            now = self.clock()
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+
+class RedisStore:
+    """Buckets shared by every app process, updated atomically by a Lua script"""
+
+    blocking = True
+
+    # KEYS[1] bucket, ARGV rate, burst; time comes from the Redis server so app clocks don't matter
+    SCRIPT = """
+        local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+        local t = redis.call('TIME')
+        local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+        local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+        local tokens = tonumber(bucket[1]) or burst
+        local updated = tonumber(bucket[2]) or now
+        tokens = math.min(burst, tokens + (now - updated) * rate)
+        local allowed = 0
+        if tokens >= 1 then
+            tokens = tokens - 1
+            allowed = 1
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+        redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+        return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self, url, prefix="museum:ratelimit:"):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.script = self.client.register_script(self.SCRIPT)
+
+    def take(self, key, rate, burst):
+        allowed, tokens = self.script(keys=[self.prefix + key], args=[rate, burst])
+        return bool(allowed), 0.0 if allowed else (1 - float(tokens)) / rate
+
+
+def retry_after_header(seconds):
+    """Retry-After value: whole seconds, never 0"""
+    return str(max(1, math.ceil(seconds)))
+
+
+def client_key(user_id, remote_addr):
+    """Logged-in users get their own bucket; everyone else shares one per IP"""
+    return f"user:{user_id}" if user_id is not None else f"ip:{remote_addr}"
+
+
+class RateLimiter:
+    """Token-bucket rate limits per user (or IP for anonymous visitors).
+
+    RATE_LIMITS maps a limit name to (tokens per second, burst). Each request
+    takes one token; an empty bucket answers 429 with Retry-After. Buckets live
+    in the process unless RATE_LIMIT_REDIS_URL points every worker at one store.
+    Each app gets its own store, in app.extensions["rate_limiter"].
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("RATE_LIMIT_ENABLED", True)
+        app.config.setdefault("RATE_LIMITS", {})
+        app.config.setdefault("RATE_LIMIT_REDIS_URL", None)
+        if app.config["RATE_LIMIT_REDIS_URL"]:
+            app.extensions["rate_limiter"] = RedisStore(app.config["RATE_LIMIT_REDIS_URL"])
+        else:
+            app.extensions["rate_limiter"] = MemoryStore()
+
+    @staticmethod
+    def store(app=None):
+        """The token store of app, or of the current app"""
+        return (app or current_app).extensions["rate_limiter"]
+
+    def hit(self, name, key, app=None):
+        """Spend a token from key's bucket for limit name. Returns (allowed, retry_after).
+        Pass app when calling outside an app context."""
+        app = app or current_app
+        limit = app.config["RATE_LIMITS"].get(name)
+        if not app.config["RATE_LIMIT_ENABLED"] or limit is None:
+            return True, 0.0
+        rate, burst = limit
+        return self.store(app).take(f"{name}:{key}", rate, burst)
+
+    @staticmethod
+    def too_many(retry_after):
+        response = jsonify({"error": "Too many requests, slow down"})
+        response.status_code = 429
+        response.headers["Retry-After"] = retry_after_header(retry_after)
+        return response
+
+    def limit(self, name):
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                allowed, retry_after = self.hit(name, client_key(session.get("user_id"), request.remote_addr))
+                if not allowed:
+                    return self.too_many(retry_after)
+                return view(*args, **kwargs)
+            return wrapper
+        return decorator
@@ -0,0 +1,110 @@
+from sqlalchemy import text
+
+# FTS5 index over the searchable card columns. It is an external-content table
+# (the text lives in `card`), kept in sync by the triggers below.
+# The trigram tokenizer gives substring/prefix matching and lets us do fuzzy
+# matching by OR-ing the trigrams of the query together.
+FTS_TABLE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS card_fts USING fts5(
+    to_name, from_name, location, message,
+    content='card', content_rowid='id', tokenize='trigram'
+)
+"""
+
+FTS_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS card_fts_ai AFTER INSERT ON card BEGIN
+        INSERT INTO card_fts(rowid, to_name, from_name, location, message)
+        VALUES (new.id, new.to_name, new.from_name, new.location, new.message);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS card_fts_ad AFTER DELETE ON card BEGIN
+        INSERT INTO card_fts(card_fts, rowid, to_name, from_name, location, message)
+        VALUES ('delete', old.id, old.to_name, old.from_name, old.location, old.message);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS card_fts_au AFTER UPDATE OF to_name, from_name, location, message ON card BEGIN
+        INSERT INTO card_fts(card_fts, rowid, to_name, from_name, location, message)
+        VALUES ('delete', old.id, old.to_name, old.from_name, old.location, old.message);
+        INSERT INTO card_fts(rowid, to_name, from_name, location, message)
+        VALUES (new.id, new.to_name, new.from_name, new.location, new.message);
+    END
+    """,
+]
+
+# bm25 column weights: to_name, from_name, location, message
+RANKING = "bm25(card_fts, 10.0, 10.0, 3.0, 1.0)"
+
+
+def create_search_index(conn):
+    """Create the FTS table and triggers on an open connection, filling the index if the table is new"""
+    exists = conn.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'card_fts'"
+    )).first()
+    conn.execute(text(FTS_TABLE))
+    for trigger in FTS_TRIGGERS:
+        conn.execute(text(trigger))
+    if not exists:
+        conn.execute(text("INSERT INTO card_fts(card_fts) VALUES ('rebuild')"))
+
+
+def init_search_index(engine):
+    with engine.begin() as conn:
+        create_search_index(conn)
+
+
+def rebuild_search_index(conn):
+    conn.execute(text("INSERT INTO card_fts(card_fts) VALUES ('rebuild')"))
+
+
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+
+def quote(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def build_match_query(query):
+    """Turn user input into an FTS5 MATCH expression.
+
+    The whole query as a phrase matches any substring of any column. On top of
+    that every trigram of the query is OR-ed against the name columns, so a
+    name with a typo still matches and bm25 ranks it by how many trigrams it
+    shares with the query.
+    """
+    query = normalize_query(query)
+    trigrams = sorted({query[i:i + 3] for i in range(len(query) - 2)})
+    fuzzy = " OR ".join(quote(t) for t in trigrams)
+    return f"{quote(query)} OR {{to_name from_name}} : ({fuzzy})"
+
+
+def search_card_ids(conn, query, limit, offset=0, status="approved"):
+    """Return ids of cards matching query, best match first"""
+    query = normalize_query(query)
+    if not query:
+        return []
+
+    if len(query) < 3:
+        # trigram index can't match fewer than 3 characters, fall back to a name scan
+        rows = conn.execute(text("""
+            SELECT id FROM card
+            WHERE status = :status
+              AND (lower(to_name) LIKE :prefix OR lower(from_name) LIKE :prefix)
+            ORDER BY created DESC, id DESC
+            LIMIT :limit OFFSET :offset
+        """), {"status": status, "prefix": query.replace("%", "").replace("_", "") + "%",
+               "limit": limit, "offset": offset})
+        return [row[0] for row in rows]
+
+    rows = conn.execute(text(f"""
+        SELECT card.id FROM card_fts
+        JOIN card ON card.id = card_fts.rowid
+        WHERE card_fts MATCH :match AND card.status = :status
+        ORDER BY {RANKING}, card.created DESC
+        LIMIT :limit OFFSET :offset
+    """), {"match": build_match_query(query), "status": status,
+           "limit": limit, "offset": offset})
+    return [row[0] for row in rows]
@@ -0,0 +1,95 @@
+from sqlalchemy import text
+
+# R*Tree over the map position of every approved, geotagged card. Cards are
+# points, so each box is degenerate (min == max). Triggers keep it in step with
+# `card`, including cards entering or leaving the approved state.
+RTREE_TABLE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS card_rtree USING rtree(
+    id, min_lat, max_lat, min_lng, max_lng
+)
+"""
+
+RTREE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS card_rtree_ai AFTER INSERT ON card
+    WHEN new.status = 'approved' AND new.lat IS NOT NULL AND new.lng IS NOT NULL BEGIN
+        INSERT INTO card_rtree VALUES (new.id, new.lat, new.lat, new.lng, new.lng);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS card_rtree_ad AFTER DELETE ON card BEGIN
+        DELETE FROM card_rtree WHERE id = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS card_rtree_au AFTER UPDATE OF status, lat, lng ON card BEGIN
+        DELETE FROM card_rtree WHERE id = old.id;
+        INSERT INTO card_rtree
+        SELECT new.id, new.lat, new.lat, new.lng, new.lng
+        WHERE new.status = 'approved' AND new.lat IS NOT NULL AND new.lng IS NOT NULL;
+    END
+    """,
+]
+
+# viewports holding up to this many cards get individual markers, at any zoom; busier ones are clustered
+MAX_MARKERS = 300
+# cluster cells per 256px map tile
+CELLS_PER_TILE = 4
+
+
+def create_spatial_index(conn):
+    """Create the R*Tree and its triggers on an open connection, filling the index if the table is new"""
+    exists = conn.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'card_rtree'"
+    )).first()
+    conn.execute(text(RTREE_TABLE))
+    for trigger in RTREE_TRIGGERS:
+        conn.execute(text(trigger))
+    if not exists:
+        rebuild_spatial_index(conn)
+
+
+def init_spatial_index(engine):
+    with engine.begin() as conn:
+        create_spatial_index(conn)
+
+
+def rebuild_spatial_index(conn):
+    conn.execute(text("DELETE FROM card_rtree"))
+    conn.execute(text("""
+        INSERT INTO card_rtree
+        SELECT id, lat, lat, lng, lng FROM card
+        WHERE status = 'approved' AND lat IS NOT NULL AND lng IS NOT NULL
+    """))
+
+
+def cell_size(zoom):
+    """Cluster grid cell size in degrees for a map zoom level"""
+    return 360.0 / (2 ** zoom) / CELLS_PER_TILE
+
+
+def markers_in_bbox(conn, south, west, north, east, zoom):
+    """Markers inside the viewport: single cards while there are few enough, clusters otherwise"""
+    bbox = {"south": south, "west": west, "north": north, "east": east}
+    in_bbox = """
+        min_lat <= :north AND max_lat >= :south AND min_lng <= :east AND max_lng >= :west
+    """
+
+    count = conn.execute(text(f"SELECT COUNT(*) FROM card_rtree WHERE {in_bbox}"), bbox).scalar()
+    if count <= MAX_MARKERS:
+        rows = conn.execute(text(f"""
+            SELECT card.id, card.to_name, card.location, substr(card.message, 1, 120) AS message,
+                   length(card.message) > 120 AS truncated, card.lat, card.lng
+            FROM card_rtree JOIN card ON card.id = card_rtree.id
+            WHERE {in_bbox}
+        """), bbox)
+        return {"markers": [dict(row._mapping) for row in rows], "clusters": []}
+
+    # grid anchored to the whole globe so clusters stay put while panning
+    rows = conn.execute(text(f"""
+        SELECT COUNT(*) AS count, AVG(min_lat) AS lat, AVG(min_lng) AS lng, MIN(id) AS id
+        FROM card_rtree
+        WHERE {in_bbox}
+        GROUP BY CAST((min_lat + 90) / :cell AS INTEGER), CAST((min_lng + 180) / :cell AS INTEGER)
+    """), {**bbox, "cell": cell_size(zoom)})
+    return {"markers": [], "clusters": [dict(row._mapping) for row in rows]}
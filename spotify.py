@@ -0,0 +1,200 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from cache import TTLCache
+
+ACCOUNTS_URL = "https://accounts.spotify.com"
+API_URL = "https://api.spotify.com"
+
+
+class SpotifyClient:
+    """Spotify Web API client for track search.
+
+    Keeps one client-credentials token until shortly before it expires, sends
+    every call through a pooled keep-alive session, caches results per
+    normalised query and lets concurrent identical searches share one upstream
+    call. accounts_url and api_url can point at a local stub server.
+    """
+
+    # refresh the token this many seconds before Spotify says it expires
+    TOKEN_MARGIN = 60
+
+    def __init__(self, client_id, client_secret, accounts_url=ACCOUNTS_URL, api_url=API_URL,
+                 cache_size=256, cache_ttl=300, timeout=5, pool_size=10, clock=time.monotonic):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.accounts_url = accounts_url.rstrip("/")
+        self.api_url = api_url.rstrip("/")
+        self.timeout = timeout
+        self.clock = clock
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.cache = TTLCache(cache_size, cache_ttl, clock)
+        self._token = None
+        self._token_expires = 0
+        self._token_lock = threading.Lock()
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+    def get_token(self):
+        """Return a valid access token, minting a new one only when needed"""
+        with self._token_lock:
+            if self._token and self.clock() < self._token_expires:
+                return self._token
+            response = self.session.post(
+                f"{self.accounts_url}/api/token",
+                data={"grant_type": "client_credentials"},
+                auth=(self.client_id or "", self.client_secret or ""),
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            data = response.json()
+            self._token = data["access_token"]
+            self._token_expires = self.clock() + data.get("expires_in", 3600) - self.TOKEN_MARGIN
+            return self._token
+
+    def invalidate_token(self):
+        with self._token_lock:
+            self._token = None
+
+    @staticmethod
+    def normalize(query):
+        return " ".join(query.lower().split())
+
+    def search_tracks(self, query, limit=5):
+        key = (self.normalize(query), limit)
+        result = self.cache.get(key)
+        if result is not None:
+            return result
+
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = self._search(key[0], limit)
+            self.cache.set(key, result)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+
+    def _search(self, query, limit):
+        for attempt in range(2):
+            response = self.session.get(
+                f"{self.api_url}/v1/search",
+                headers={"Authorization": f"Bearer {self.get_token()}"},
+                params={"q": query, "type": "track", "limit": limit},
+                timeout=self.timeout,
+            )
+            # token revoked or expired early, mint a new one and retry once
+            if response.status_code == 401 and attempt == 0:
+                self.invalidate_token()
+                continue
+            response.raise_for_status()
+            return response.json()
+
+
+class AsyncSpotifyClient:
+    """asyncio version of SpotifyClient on one pooled httpx.AsyncClient, used by asgi.py.
+
+    Same token reuse, caching and coalescing of identical searches. Pass the sync
+    client's cache so both serving modes share results.
+    """
+
+    TOKEN_MARGIN = SpotifyClient.TOKEN_MARGIN
+
+    def __init__(self, client_id, client_secret, accounts_url=ACCOUNTS_URL, api_url=API_URL,
+                 cache=None, cache_size=256, cache_ttl=300, timeout=5, pool_size=100, clock=time.monotonic):
+        # only the ASGI entry point uses this client, so httpx is imported here
+        try:
+            import httpx
+        except ImportError:
+            raise RuntimeError("AsyncSpotifyClient needs httpx (pip install httpx)") from None
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.accounts_url = accounts_url.rstrip("/")
+        self.api_url = api_url.rstrip("/")
+        self.clock = clock
+        self.http = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+        self.cache = cache if cache is not None else TTLCache(cache_size, cache_ttl, clock)
+        self._token = None
+        self._token_expires = 0
+        self._token_lock = asyncio.Lock()
+        self._inflight = {}
+
+    async def get_token(self):
+        async with self._token_lock:
+            if self._token and self.clock() < self._token_expires:
+                return self._token
+            response = await self.http.post(
+                f"{self.accounts_url}/api/token",
+                data={"grant_type": "client_credentials"},
+                auth=(self.client_id or "", self.client_secret or ""),
+            )
+            response.raise_for_status()
+            data = response.json()
+            self._token = data["access_token"]
+            self._token_expires = self.clock() + data.get("expires_in", 3600) - self.TOKEN_MARGIN
+            return self._token
+
+    async def search_tracks(self, query, limit=5):
+        key = (SpotifyClient.normalize(query), limit)
+        result = self.cache.get(key)
+        if result is not None:
+            return result
+
+        # single event loop, so no lock is needed around the in-flight table
+        future = self._inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await self._search(key[0], limit)
+            self.cache.set(key, result)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            # nobody may be waiting on it, don't warn about an unretrieved exception
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _search(self, query, limit):
+        for attempt in range(2):
+            response = await self.http.get(
+                f"{self.api_url}/v1/search",
+                headers={"Authorization": f"Bearer {await self.get_token()}"},
+                params={"q": query, "type": "track", "limit": limit},
+            )
+            if response.status_code == 401 and attempt == 0:
+                self._token = None
+                continue
+            response.raise_for_status()
+            return response.json()
+
+    async def aclose(self):
+        await self.http.aclose()
@@ -0,0 +1,175 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from sqlalchemy import text
+
+CHUNK_SIZE = 64 * 1024
+# blob paths and everything derived from them (variants, posters)
+CONTENT_ADDRESSED = re.compile(r"^uploads/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}[._]")
+
+
+def blob_path(digest, ext):
+    """Sharded path for a blob, relative to the static folder: uploads/ab/cd/abcd....jpg"""
+    return f"uploads/{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+
+def is_content_addressed(path):
+    return bool(CONTENT_ADDRESSED.match(path))
+
+
+def is_upload_path(path):
+    """Whether a stored path names a file in the upload store: under uploads/, not a temp file, no '..'"""
+    return (isinstance(path, str) and path.startswith("uploads/") and not path.startswith("uploads/.tmp/")
+            and ".." not in path.split("/") and "\\" not in path)
+
+
+def upload_file(static_folder, path):
+    """Full path of an upload on disk, or None if path (or a symlink on the way) leads out of uploads/"""
+    if not is_upload_path(path):
+        return None
+    root = os.path.realpath(os.path.join(static_folder, "uploads"))
+    full_path = os.path.join(static_folder, path)
+    if os.path.commonpath([root, os.path.realpath(full_path)]) != root:
+        return None
+    return full_path
+
+
+def store_stream(stream, static_folder, ext):
+    """Stream bytes through sha256 into the blob store, returns the blob's relative path.
+
+    The file is written to a temp file first and renamed into place, so readers
+    never see a half-written blob and concurrent uploads can't clash. Identical
+    content always lands on the same path and is only kept once.
+    """
+    tmp_dir = os.path.join(static_folder, "uploads", ".tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False) as tmp:
+        try:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+                tmp.write(chunk)
+        except BaseException:
+            tmp.close()
+            os.remove(tmp.name)
+            raise
+
+    path = blob_path(digest.hexdigest(), ext.lower())
+    target = os.path.join(static_folder, path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if os.path.exists(target):
+        # already stored, and blobs are never rewritten, so the existing file is identical
+        os.remove(tmp.name)
+    else:
+        os.replace(tmp.name, target)
+    return path
+
+
+def save_derived(static_folder, path, write):
+    """Write a file derived from a blob (a variant, a poster) through a temp file.
+
+    write(f) fills the open temp file; it is renamed to path only once complete,
+    so readers never see a partial file and two workers writing the same
+    variant just replace one complete copy with another.
+    """
+    tmp_dir = os.path.join(static_folder, "uploads", ".tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False) as tmp:
+        try:
+            write(tmp)
+        except BaseException:
+            tmp.close()
+            os.remove(tmp.name)
+            raise
+    os.replace(tmp.name, os.path.join(static_folder, path))
+    return path
+
+
+def save_upload(file_storage, static_folder):
+    """Store a Werkzeug FileStorage upload, returns its relative path"""
+    ext = os.path.splitext(file_storage.filename)[1]
+    return store_stream(file_storage.stream, static_folder, ext)
+
+
+def acquire(session, path, n=1):
+    """Add n references to a stored blob"""
+    session.execute(text("""
+        INSERT INTO blob (path, refcount) VALUES (:path, :n)
+        ON CONFLICT(path) DO UPDATE SET refcount = refcount + :n
+    """), {"path": path, "n": n})
+
+
+def acquire_many(session, counts, references_sql):
+    """Add counts[path] references to each blob in two executemany calls.
+
+    Files saved before the blob store may be referenced already without having
+    a row, so a new row for one of those starts from references_sql, a query
+    counting every reference to :path (the new ones included).
+    """
+    params = [{"path": path, "n": n} for path, n in counts.items()]
+    hashed = [p for p in params if is_content_addressed(p["path"])]
+    legacy = [p for p in params if not is_content_addressed(p["path"])]
+    upsert = """
+        INSERT INTO blob (path, refcount) VALUES (:path, {initial})
+        ON CONFLICT(path) DO UPDATE SET refcount = refcount + :n
+    """
+    if hashed:
+        session.execute(text(upsert.format(initial=":n")), hashed)
+    if legacy:
+        session.execute(text(upsert.format(initial=f"({references_sql})")), legacy)
+
+
+def release(session, path, n=1):
+    """Drop n references to a blob. Returns True once nothing refers to it any more.
+
+    Files saved before the blob store existed have no blob row; they were never
+    shared, so releasing them always counts as the last reference.
+    """
+    row = session.execute(text(
+        "UPDATE blob SET refcount = refcount - :n WHERE path = :path RETURNING refcount"
+    ), {"path": path, "n": n}).first()
+    if row is None:
+        return True
+    if row.refcount <= 0:
+        session.execute(text("DELETE FROM blob WHERE path = :path"), {"path": path})
+        return True
+    return False
+
+
+def claim(session, path):
+    """Mark a blob as being post-processed. False if another worker already has it.
+
+    Identical uploads share a blob, so several media jobs can be queued for
+    one file; only the one holding the claim processes it. Commit straight
+    away so the other workers see the claim.
+    """
+    row = session.execute(text(
+        "UPDATE blob SET processing = 1 WHERE path = :path AND NOT processing RETURNING path"
+    ), {"path": path}).first()
+    if row is not None:
+        return True
+    # files from before the blob store have no row, and were never shared
+    return session.execute(text("SELECT 1 FROM blob WHERE path = :path"), {"path": path}).first() is None
+
+
+def unclaim(session, path):
+    """Let the blob be processed again (e.g. by a job for a later upload of the same file)"""
+    session.execute(text("UPDATE blob SET processing = 0 WHERE path = :path"), {"path": path})
+
+
+def remove_files(session, static_folder, paths):
+    """Unlink released files. Call after the releasing transaction has committed.
+
+    Only files in the upload store are ever removed, whatever path a card ended up with.
+    """
+    for path in paths:
+        full_path = upload_file(static_folder, path)
+        if full_path is None:
+            continue
+        # skip anything re-acquired by an upload since it was released
+        if session.execute(text("SELECT 1 FROM blob WHERE path = :path"), {"path": path}).first():
+            continue
+        if os.path.exists(full_path):
+            os.remove(full_path)
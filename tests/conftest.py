@@ -0,0 +1,59 @@
+import os
+import sys
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PASSWORD = "test-password"
+
+
+@pytest.fixture
+def app(tmp_path):
+    """The app on a migrated throwaway database, storing uploads under tmp_path"""
+    from flask_migrate import upgrade
+
+    from app import create_app, init_migrations
+
+    app = create_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'test.db'}",
+        "PARTIAL_UPLOAD_FOLDER": str(tmp_path / "partial_uploads"),
+        "MEDIA_WORKERS": 0,
+        "RATE_LIMIT_ENABLED": False,
+    })
+    app.static_folder = str(tmp_path / "static")
+    init_migrations(app)
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, "migrations"))
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    from app import User, db
+
+    hashed = generate_password_hash(PASSWORD)
+
+    def make_user(username, is_admin=False):
+        with app.app_context():
+            user = User(username=username, email=f"{username}@example.com", password=hashed, is_admin=is_admin)
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+    return make_user
+
+
+@pytest.fixture
+def login(client):
+    def login(username, **form):
+        response = client.post("/login", data={"username": username, "password": PASSWORD, **form})
+        assert response.status_code == 302
+    return login
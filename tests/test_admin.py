@@ -0,0 +1,62 @@
+from flask import g
+
+from app import CARD_STATUSES, Card, Photo, User, db
+
+
+def seed(app, users, cards_per_user):
+    """users more users, each with cards_per_user cards (two photos each) spread over every status"""
+    with app.app_context():
+        start = User.query.count()
+        for i in range(start, start + users):
+            user = User(username=f"seed{i}", email=f"seed{i}@example.com")
+            db.session.add(user)
+            db.session.flush()
+            for j in range(cards_per_user):
+                card = Card(to_name=f"to {i}", location="FCI", message="hello", user_id=user.id,
+                            status=CARD_STATUSES[j % len(CARD_STATUSES)])
+                db.session.add(card)
+                db.session.flush()
+                db.session.add_all(Photo(card_id=card.id, file_path=f"uploads/{i}_{j}_{k}.jpg") for k in range(2))
+        db.session.commit()
+
+
+def test_admin_dashboard_query_count_does_not_grow(app, client, make_user, login):
+    counts = []
+
+    @app.after_request
+    def record_query_count(response):
+        counts.append(g.get("query_count", 0))
+        return response
+
+    make_user("admin", is_admin=True)
+    login("admin")
+
+    dashboard, second_users_page = [], []
+    for users in (10, 60, 150):
+        seed(app, users, cards_per_user=4)
+        counts.clear()
+        # TooManyQueries fails the request outright past MAX_QUERIES_PER_REQUEST
+        assert client.get("/admin").status_code == 200
+        assert client.get("/admin", query_string={"users_page": 2}).status_code == 200
+        dashboard.append(counts[0])
+        second_users_page.append(counts[1])
+
+    assert dashboard[0] == dashboard[1] == dashboard[2]
+    # the first round has too few users to reach a second page
+    assert second_users_page[1] == second_users_page[2]
+
+
+def test_admin_pages_need_an_admin(app, client, make_user, login):
+    make_user("someone")
+    for path in ("/admin", "/admin/cards/pending"):
+        response = client.get(path)
+        assert response.status_code == 302 and "/login" in response.location
+
+    login("someone")
+    assert client.get("/admin").status_code == 403
+    assert client.get("/admin/cards/pending").status_code == 403
+
+    # the login page's admin passcode
+    login("someone", admin_check="yes", passcode="1234")
+    assert client.get("/admin").status_code == 200
+    assert client.get("/admin/cards/pending").status_code == 200
@@ -0,0 +1,36 @@
+from app import create_app, page_cache
+
+
+def make_app(tmp_path, name, **config):
+    return create_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / name}.db",
+        "PARTIAL_UPLOAD_FOLDER": str(tmp_path / "partial_uploads"),
+        "MEDIA_WORKERS": 0,
+        **config,
+    })
+
+
+def test_apps_keep_their_own_extension_state(tmp_path):
+    a = make_app(tmp_path, "a", RATE_LIMITS={"location": (0.001, 1)})
+    b = make_app(tmp_path, "b", RATE_LIMIT_ENABLED=False)
+
+    point = {"lat": "2.9276", "lng": "101.6413"}
+    client_a, client_b = a.test_client(), b.test_client()
+    assert client_a.post("/location", data=point).status_code == 200
+    assert client_a.post("/location", data=point).status_code == 429
+    assert all(client_b.post("/location", data=point).status_code == 200 for _ in range(3))
+
+    for name in ("metrics", "media", "page_cache", "rate_limiter", "mail_queue"):
+        assert a.extensions[name] is not b.extensions[name] or a.extensions[name] is None
+
+    with a.app_context():
+        page_cache.invalidate("feed")
+        assert page_cache.backend.generation("feed") == 1
+    with b.app_context():
+        assert page_cache.backend.generation("feed") == 0
+
+
+def test_home_link_is_left_off_the_home_page(client):
+    assert b'class="footer-home"' not in client.get("/").data
+    assert b'class="footer-home"' in client.get("/contacts").data
@@ -0,0 +1,63 @@
+import base64
+import io
+import os
+
+import pytest
+
+from app import Blob, Card, Photo, User
+
+# a 4x4 red PNG
+PNG = base64.b64decode("iVBORw0KGgoAAAANSUhEUgAAAAQAAAAECAIAAAAmkwkpAAAAFElEQVR4nGM8wcXFAANMDEgANwcALLoA5DVVUv0AAAAASUVORK5CYII=")
+
+
+def create_card(client, photos=2):
+    response = client.post("/create", data={
+        "to_name": "you", "location": "FCI", "message": "hello",
+        "photos": [(io.BytesIO(PNG), f"photo{i}.png") for i in range(photos)],
+    }, content_type="multipart/form-data", headers={"Accept": "application/json"})
+    assert response.status_code == 201
+    return response.get_json()["id"]
+
+
+def stored_files(app):
+    with app.app_context():
+        paths = [p.file_path for p in Photo.query]
+    return [os.path.join(app.static_folder, path) for path in paths]
+
+
+@pytest.mark.parametrize("photos", [1, 3])
+def test_delete_profile_with_photos(app, client, make_user, login, photos):
+    make_user("owner")
+    login("owner")
+    create_card(client, photos)
+    create_card(client, photos)
+    files = stored_files(app)
+    assert files and all(os.path.exists(f) for f in files)
+
+    response = client.post("/delete_profile")
+    assert response.status_code == 302
+
+    with app.app_context():
+        assert User.query.count() == 0
+        assert Card.query.count() == 0
+        assert Photo.query.count() == 0
+        assert Blob.query.count() == 0
+    assert not any(os.path.exists(f) for f in files)
+
+
+def test_admin_delete_user_with_photos(app, client, make_user, login):
+    owner_id = make_user("owner")
+    make_user("admin", is_admin=True)
+    login("owner")
+    create_card(client)
+    files = stored_files(app)
+
+    login("admin")
+    response = client.post(f"/admin/delete_user/{owner_id}")
+    assert response.status_code == 302
+
+    with app.app_context():
+        assert [u.username for u in User.query] == ["admin"]
+        assert Card.query.count() == 0
+        assert Photo.query.count() == 0
+    assert not any(os.path.exists(f) for f in files)
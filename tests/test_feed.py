@@ -0,0 +1,28 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app import Card, Photo, db
+
+
+def test_feed_does_not_load_photos(app, client):
+    with app.app_context():
+        for i in range(3):
+            card = Card(to_name=f"to {i}", location="FCI", message="hello", status="approved")
+            db.session.add(card)
+            db.session.flush()
+            db.session.add(Photo(card_id=card.id, file_path=f"uploads/{i}.jpg"))
+        db.session.commit()
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", record)
+    try:
+        response = client.get("/")
+    finally:
+        event.remove(Engine, "before_cursor_execute", record)
+
+    assert response.status_code == 200 and b"to 2" in response.data
+    assert not any("FROM photo" in statement for statement in statements)
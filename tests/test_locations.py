@@ -0,0 +1,34 @@
+import random
+
+from locations import DEFAULT_LOCATION, Region, RegionIndex, map_locations
+
+# one 1x1 degree polygon around the campus
+CYBERJAYA = Region("Cyberjaya", [(2.5, 101.0), (3.5, 101.0), (3.5, 102.0), (2.5, 102.0)])
+
+
+def scan(regions, lat, lng):
+    """What the index must agree with: the smallest region containing the point"""
+    for region in sorted(regions, key=lambda r: r.area):
+        if region.contains(lat, lng):
+            return region.name
+    return DEFAULT_LOCATION
+
+
+def test_large_polygon_among_small_regions():
+    regions = [Region(name, points) for name, points in map_locations.items()] + [CYBERJAYA]
+    index = RegionIndex(regions)
+
+    assert len(index.cells) < 1000 and index.large == [CYBERJAYA]
+    assert index.lookup(3.0, 101.5) == "Cyberjaya"
+    assert index.lookup(0.0, 0.0) == DEFAULT_LOCATION
+
+    rng = random.Random(4)
+    for _ in range(5000):
+        lat, lng = rng.uniform(2.9262, 2.9280), rng.uniform(101.6404, 101.6432)
+        assert index.lookup(lat, lng) == scan(regions, lat, lng)
+
+
+def test_cell_size_follows_the_regions():
+    assert RegionIndex([CYBERJAYA]).cell_size == 1.0
+    assert RegionIndex([CYBERJAYA]).large == []
+    assert RegionIndex([]).lookup(3.0, 101.5) == DEFAULT_LOCATION
@@ -0,0 +1,25 @@
+import spatial_index
+from app import Card, db
+
+# the campus viewport the map opens on (zoom 15)
+CAMPUS = {"bbox": "2.920,101.634,2.934,101.650", "zoom": 15}
+
+
+def add_cards(app, count):
+    with app.app_context():
+        db.session.add_all(Card(to_name="you", location="FCI", message="hello", status="approved",
+                                lat=2.9270 + i * 0.00001, lng=101.6410) for i in range(count))
+        db.session.commit()
+
+
+def test_front_page_viewport_shows_markers(app, client):
+    add_cards(app, 5)
+    data = client.get("/api/markers", query_string=CAMPUS).get_json()
+    assert len(data["markers"]) == 5 and data["clusters"] == []
+
+
+def test_busy_viewport_is_clustered(app, client, monkeypatch):
+    monkeypatch.setattr(spatial_index, "MAX_MARKERS", 3)
+    add_cards(app, 5)
+    data = client.get("/api/markers", query_string=CAMPUS).get_json()
+    assert data["markers"] == [] and sum(cluster["count"] for cluster in data["clusters"]) == 5
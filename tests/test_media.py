@@ -0,0 +1,57 @@
+import hashlib
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from app import Blob, Photo, media
+import storage
+
+
+def jpeg_with_exif():
+    exif = Image.Exif()
+    exif[0x010E] = "taken at home"  # ImageDescription
+    buffer = io.BytesIO()
+    Image.new("RGB", (900, 600), (30, 120, 200)).save(buffer, "JPEG", exif=exif)
+    return buffer.getvalue()
+
+
+def upload_duplicates(client, data, count):
+    response = client.post("/create", data={
+        "to_name": "you", "location": "FCI", "message": "hello",
+        "photos": [(io.BytesIO(data), f"same{i}.jpg") for i in range(count)],
+    }, content_type="multipart/form-data", headers={"Accept": "application/json"})
+    assert response.status_code == 201
+
+
+@pytest.mark.parametrize("workers", [0, 4])
+def test_duplicate_photos_are_stripped_into_one_new_blob(app, client, make_user, login, workers):
+    if workers:
+        app.config["MEDIA_WORKERS"] = workers
+        media.init_app(app)
+    make_user("owner")
+    login("owner")
+    data = jpeg_with_exif()
+    original = storage.blob_path(hashlib.sha256(data).hexdigest(), ".jpg")
+
+    upload_duplicates(client, data, 6)
+    if app.extensions["media"] is not None:
+        app.extensions["media"].shutdown(wait=True)
+
+    with app.app_context():
+        photos = Photo.query.all()
+        paths = {photo.file_path for photo in photos}
+        assert len(photos) == 6 and all(photo.variant_data.get("thumb") for photo in photos)
+        blobs = {blob.path: blob for blob in Blob.query}
+
+    # every photo moved to one clean blob whose name still matches its content
+    assert len(paths) == 1 and original not in paths
+    path = paths.pop()
+    with open(os.path.join(app.static_folder, path), "rb") as f:
+        assert storage.blob_path(hashlib.sha256(f.read()).hexdigest(), ".jpg") == path
+    with Image.open(os.path.join(app.static_folder, path)) as image:
+        assert not image.getexif()
+
+    assert list(blobs) == [path] and blobs[path].refcount == 6 and not blobs[path].processing
+    assert not os.path.exists(os.path.join(app.static_folder, original))
@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+import storage
+import transfer
+from app import Card, db
+from test_delete_user import create_card
+
+
+@pytest.mark.parametrize("path", ["../victim.txt", "uploads/../../victim.txt", "uploads/.tmp/x", "/etc/passwd"])
+def test_files_outside_uploads_are_never_removed(app, tmp_path, path):
+    victim = tmp_path / "victim.txt"
+    victim.write_text("keep me")
+    os.makedirs(os.path.join(app.static_folder, "uploads"), exist_ok=True)
+
+    with app.app_context():
+        storage.remove_files(db.session, app.static_folder, [path, str(victim)])
+    assert victim.exists()
+
+
+def test_edited_card_keeps_no_free_form_video(app, client, make_user, login, tmp_path):
+    victim = tmp_path / "victim.txt"
+    victim.write_text("keep me")
+    make_user("admin", is_admin=True)
+    login("admin")
+    card_id = create_card(client, photos=1)
+
+    response = client.post(f"/edit/{card_id}", data={
+        "to_name": "you", "location": "FCI", "message": "hello", "from_name": "me",
+        "lat": "2.9276", "lng": "101.6413", "video": "../victim.txt",
+    })
+    assert response.status_code == 302
+    with app.app_context():
+        assert db.session.get(Card, card_id).video is None
+
+    client.post(f"/delete/{card_id}")
+    assert victim.exists()
+
+
+def test_import_rejects_paths_outside_uploads():
+    record = {"to_name": "you", "message": "hello", "location": "FCI"}
+    assert transfer.clean_record(dict(record, photos=["uploads/a.jpg"]), set())[1] == ["uploads/a.jpg"]
+    for bad in ({"video": "../victim.txt"}, {"video_poster": "uploads/.tmp/x"}, {"photos": ["/etc/passwd"]}):
+        with pytest.raises(ValueError):
+            transfer.clean_record(dict(record, **bad), set())
@@ -0,0 +1,51 @@
+import base64
+
+from app import Card, db
+from test_delete_user import create_card
+
+VIDEO = b"\x00\x00\x00\x18ftypmp42" + bytes(20)
+
+
+def start_upload(client, card_id):
+    return client.post(f"/card/{card_id}/video/uploads", headers={
+        "Tus-Resumable": "1.0.0",
+        "Upload-Length": str(len(VIDEO)),
+        "Upload-Metadata": "filename " + base64.b64encode(b"clip.mp4").decode(),
+    })
+
+
+def set_status(app, card_id, status):
+    with app.app_context():
+        db.session.get(Card, card_id).status = status
+        db.session.commit()
+
+
+def test_approved_card_takes_no_new_video(app, client, make_user, login):
+    make_user("owner")
+    login("owner")
+    card_id = create_card(client, photos=1)
+    set_status(app, card_id, "approved")
+
+    assert start_upload(client, card_id).status_code == 409
+    with app.app_context():
+        assert db.session.get(Card, card_id).video is None
+
+
+def test_video_finished_after_approval_goes_back_to_review(app, client, make_user, login):
+    make_user("owner")
+    login("owner")
+    card_id = create_card(client, photos=1)
+    response = start_upload(client, card_id)
+    assert response.status_code == 201
+
+    set_status(app, card_id, "approved")
+    response = client.patch(response.headers["Location"], data=VIDEO, headers={
+        "Tus-Resumable": "1.0.0",
+        "Content-Type": "application/offset+octet-stream",
+        "Upload-Offset": "0",
+    })
+    assert response.status_code == 204
+
+    with app.app_context():
+        card = db.session.get(Card, card_id)
+        assert card.video and card.status == "pending"
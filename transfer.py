@@ -0,0 +1,174 @@
+"""Export cards (with their photo paths) as NDJSON or CSV, and import them back.
+
+Exports stream straight from the database cursor, a batch of rows at a time,
+so memory use stays flat however many cards there are. Imports insert cards
+and photos in batches and fill in `location` from lat/lng when it is missing.
+"""
+import csv
+import io
+import json
+import time
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import text
+
+import storage
+from locations import get_faculty_names
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+COLUMNS = ["id", "to_name", "from_name", "location", "message", "video", "video_poster", "song",
+           "created", "lat", "lng", "status", "user_id", "photos"]
+# written into each card on import; id is not kept, imported cards get new ids
+CARD_FIELDS = ["to_name", "from_name", "location", "message", "video", "video_poster", "song",
+               "created", "lat", "lng", "status", "user_id"]
+STATUSES = ("pending", "approved", "rejected", "archived")
+# same text format SQLAlchemy's DateTime uses on SQLite
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+EXPORT_QUERY = """
+    SELECT c.id, c.to_name, c.from_name, c.location, c.message, c.video, c.video_poster, c.song,
+           c.created, c.lat, c.lng, c.status, c.user_id,
+           (SELECT json_group_array(file_path)
+            FROM (SELECT file_path FROM photo WHERE card_id = c.id ORDER BY id)) AS photos
+    FROM card c
+    {where}
+    ORDER BY c.id
+"""
+
+
+def export_rows(conn, status=None, batch_size=500):
+    """Yield every card as a dict, photos as a list of paths"""
+    where = "WHERE c.status = :status" if status else ""
+    result = conn.execution_options(yield_per=batch_size).execute(
+        text(EXPORT_QUERY.format(where=where)), {"status": status})
+    for row in result.mappings():
+        card = dict(row)
+        card["photos"] = json.loads(card["photos"])
+        yield card
+
+
+def to_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+def to_csv(rows):
+    """CSV lines, photos joined with ';' into one cell"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, COLUMNS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(dict(row, photos=";".join(row["photos"])))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def serialize(rows, fmt):
+    return to_csv(rows) if fmt == "csv" else to_ndjson(rows)
+
+
+def read_records(stream, fmt):
+    """Parse a text stream of NDJSON or CSV into card dicts, one at a time"""
+    if fmt == "csv":
+        for row in csv.DictReader(stream):
+            record = {key: (value if value != "" else None) for key, value in row.items()}
+            record["photos"] = (record.get("photos") or "").split(";")
+            yield record
+    else:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _float(value):
+    return None if value is None else float(value)
+
+
+def _datetime(value):
+    if not value:
+        return datetime.utcnow().strftime(DATETIME_FORMAT)
+    return datetime.fromisoformat(value).strftime(DATETIME_FORMAT)
+
+
+def clean_record(record, user_ids):
+    """Card row ready to insert plus its photo paths. Raises ValueError on a bad record."""
+    card = {field: record.get(field) for field in CARD_FIELDS}
+    if not card["to_name"] or not card["message"]:
+        raise ValueError("to_name and message are required")
+    card["lat"], card["lng"] = _float(card["lat"]), _float(card["lng"])
+    if not card["location"] and (card["lat"] is None or card["lng"] is None):
+        raise ValueError("needs a location or lat/lng")
+    card["created"] = _datetime(card["created"])
+    if card["status"] not in STATUSES:
+        card["status"] = "pending"
+    # cards from another database may name users that don't exist here
+    user_id = card["user_id"]
+    card["user_id"] = int(user_id) if user_id is not None and int(user_id) in user_ids else None
+    photos = [path for path in record.get("photos") or [] if path]
+    # stored paths end up being served and, once released, unlinked: only the upload store will do
+    for path in photos + [card["video"], card["video_poster"]]:
+        if path and not storage.is_upload_path(path):
+            raise ValueError(f"{path!r} is not a file under uploads/")
+    return card, photos
+
+
+def insert_batch(conn, batch):
+    """Insert one batch of (card, photos) pairs with executemany"""
+    missing = [card for card, _ in batch if not card["location"]]
+    if missing:
+        names = get_faculty_names([(card["lat"], card["lng"]) for card in missing])
+        for card, name in zip(missing, names):
+            card["location"] = name
+
+    cards = [card for card, _ in batch]
+    # executemany can't hand back generated ids, so the batch takes the next id range.
+    # The import holds SQLite's write lock from its first insert on; a card inserted by
+    # someone else before that makes the insert fail on the primary key, never mix up ids.
+    first_id = conn.execute(text("SELECT COALESCE(MAX(id), 0) + 1 FROM card")).scalar()
+    for offset, card in enumerate(cards):
+        card["id"] = first_id + offset
+    conn.execute(text(f"""
+        INSERT INTO card (id, {", ".join(CARD_FIELDS)})
+        VALUES (:id, {", ".join(":" + field for field in CARD_FIELDS)})
+    """), cards)
+
+    photos = [{"card_id": card["id"], "file_path": path} for card, paths in batch for path in paths]
+    if photos:
+        conn.execute(text("INSERT INTO photo (card_id, file_path) VALUES (:card_id, :file_path)"), photos)
+
+    # imported cards share the stored files with whatever already points at them
+    storage.acquire_many(conn, Counter(photo["file_path"] for photo in photos),
+                         "SELECT COUNT(*) FROM photo WHERE file_path = :path")
+    storage.acquire_many(conn, Counter(card["video"] for card in cards if card["video"]),
+                         "SELECT COUNT(*) FROM card WHERE video = :path")
+    return len(photos)
+
+
+def import_cards(conn, records, batch_size=1000):
+    """Insert records in batches on an open transaction. Returns counts and rows per second."""
+    user_ids = set(conn.execute(text("SELECT id FROM user")).scalars())
+    stats = {"cards": 0, "photos": 0, "skipped": 0, "errors": []}
+    started = time.perf_counter()
+    batch = []
+    for number, record in enumerate(records, 1):
+        try:
+            batch.append(clean_record(record, user_ids))
+        except (TypeError, ValueError) as e:
+            stats["skipped"] += 1
+            if len(stats["errors"]) < 20:
+                stats["errors"].append(f"record {number}: {e}")
+            continue
+        if len(batch) >= batch_size:
+            stats["photos"] += insert_batch(conn, batch)
+            stats["cards"] += len(batch)
+            batch = []
+    if batch:
+        stats["photos"] += insert_batch(conn, batch)
+        stats["cards"] += len(batch)
+
+    stats["seconds"] = time.perf_counter() - started
+    stats["rows_per_second"] = stats["cards"] / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
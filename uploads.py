@@ -0,0 +1,83 @@
+"""Helpers for resumable, chunked uploads (a subset of the tus 1.0 protocol).
+
+A client creates an upload with its total length, then PATCHes the bytes in
+any number of chunks, each starting at the offset the server has confirmed.
+After a dropped connection it asks for the current offset (HEAD) and carries
+on from there. Chunks are streamed straight to a partial file on disk.
+"""
+import base64
+import hashlib
+import os
+
+TUS_VERSION = "1.0.0"
+CHUNK_SIZE = 64 * 1024
+CHECKSUM_ALGORITHMS = ("sha1", "sha256", "md5")
+
+
+class UploadError(Exception):
+    status = 400
+
+
+class ChecksumMismatch(UploadError):
+    status = 460  # tus checksum extension
+
+
+class OffsetMismatch(UploadError):
+    status = 409
+
+
+def parse_metadata(header):
+    """Decode an Upload-Metadata header: "key base64value,key2 base64value2" """
+    metadata = {}
+    for pair in filter(None, (p.strip() for p in (header or "").split(","))):
+        key, _, value = pair.partition(" ")
+        try:
+            metadata[key] = base64.b64decode(value).decode() if value else ""
+        except ValueError:
+            raise UploadError(f"bad Upload-Metadata value for {key}")
+    return metadata
+
+
+def parse_checksum(header):
+    """Split an Upload-Checksum header ("sha256 <base64 digest>") into (algorithm, digest bytes)"""
+    if not header:
+        return None, None
+    algorithm, _, value = header.partition(" ")
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        raise UploadError(f"unsupported checksum algorithm {algorithm}")
+    try:
+        return algorithm, base64.b64decode(value)
+    except ValueError:
+        raise UploadError("bad Upload-Checksum digest")
+
+
+def write_chunk(path, offset, length, stream, checksum_header=None):
+    """Write a request body into the partial file at offset, returns the new offset.
+
+    Reads at most up to the declared upload length, in fixed-size pieces, so
+    memory use doesn't depend on the chunk size. On a checksum mismatch the
+    chunk is discarded and the offset stays where it was.
+    """
+    algorithm, expected = parse_checksum(checksum_header)
+    digest = hashlib.new(algorithm) if algorithm else None
+    remaining = length - offset
+
+    with open(path, "r+b" if os.path.exists(path) else "w+b") as f:
+        f.seek(offset)
+        f.truncate()
+        while True:
+            chunk = stream.read(min(CHUNK_SIZE, remaining + 1))
+            if not chunk:
+                break
+            if len(chunk) > remaining:
+                f.truncate(offset)
+                raise UploadError("chunk goes past Upload-Length")
+            remaining -= len(chunk)
+            if digest:
+                digest.update(chunk)
+            f.write(chunk)
+
+        if digest and digest.digest() != expected:
+            f.truncate(offset)
+            raise ChecksumMismatch("chunk checksum does not match Upload-Checksum")
+        return f.tell()